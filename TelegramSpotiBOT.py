@@ -2,11 +2,22 @@
 ############# EXPLICACION ##############
 # ESTO ES EL BOT COMO TAL PARA TELEGRAM, el que tiene los comandos e interactua con spotibot_core.py que es el que realmente tiene las instrucciones para actualizar las listas
 # debes EDITAR el AUTHORIZED_USER_ID y el token
+# Comandos: un número de días sincroniza todo playlists.txt; /genero GÉNERO [días] y /playlist URL [días] solo una parte;
+# /estado muestra la última ejecución y el historial local sin llamar a Spotify; /cancelar detiene la actualización en curso
 import logging
 import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from telegram import Update
 from telegram.ext import Application, CommandHandler, MessageHandler, filters
 from spotibot_core import *  # Importamos las funciones de spotibot_core.py
+from spotibot_client import SpotifyClientManager
+from spotibot_manifest import PLAYLIST_ID
+from spotibot_metrics import REPORT_FILE
+from spotibot_pipeline import SyncCancelled
+from spotibot_state import JsonState
+from spotibot_store import TrackStore, genre_scope
 import nest_asyncio  # Necesario para entornos con un event loop ya activo
 import sys
 import os
@@ -26,6 +37,12 @@ nest_asyncio.apply()
 sp = None  # Variable para la instancia de Spotify
 user_id = None  # Variable para el ID del usuario de Spotify
 user_name = None  # Nombre del usuario
+client_manager = None  # Cliente de Spotify persistente (se crea en la primera actualización)
+
+# Las actualizaciones se ejecutan en un hilo aparte para no bloquear el bot, y solo una a la vez
+sync_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="spotibot-sync")
+sync_task = None  # Tarea asyncio de la actualización en curso
+cancel_event = threading.Event()  # /cancelar: los géneros pendientes se saltan y los que están en marcha paran antes de añadir
 
 # Función para verificar si el mensaje viene de tu cuenta
 def is_authorized_user(update: Update):
@@ -37,7 +54,20 @@ async def start(update: Update, context):
         await update.message.reply_text("No tienes permiso para usar este bot.")
         return
     
-    await update.message.reply_text("¡Hola! Soy SpotiBOT, un bot creado por GlmbXecurity. Con este bot puedes actualizar tus playlists de Spotify automáticamente. Actualizaremos las novedades de los ultimos días (Indicar días):")
+    await update.message.reply_text("¡Hola! Soy SpotiBOT, un bot creado por GlmbXecurity. Con este bot puedes actualizar tus playlists de Spotify automáticamente. Actualizaremos las novedades de los ultimos días (Indicar días):\n"
+                                    "/genero GÉNERO [días]: actualiza solo un género\n"
+                                    "/playlist URL [días]: actualiza solo una playlist de origen\n"
+                                    "/estado: última ejecución y canciones por género\n"
+                                    "/cancelar: detiene la actualización en curso")
+
+# Días opcionales de los comandos (/genero TECHNO 3); 7 por defecto
+def parse_days(args):
+    if not args:
+        return 7
+    dias_recientes = int(args[0])
+    if dias_recientes <= 0:
+        raise ValueError("Por favor, ingresa un número positivo.")
+    return dias_recientes
 
 # Función para manejar el comando que recibe el rango de días
 async def handle_message(update: Update, context):
@@ -59,74 +89,223 @@ async def handle_message(update: Update, context):
         dias_recientes = 7
         await update.message.reply_text(f"Usando {dias_recientes} días por defecto.")
 
-    await update.message.reply_text(f"Comenzando la actualización de novedades para los últimos {dias_recientes} días...")
+    await start_sync(update, context, dias_recientes)
+
+# /genero GÉNERO [días]: sincroniza un solo género de playlists.txt
+async def sync_genre_command(update: Update, context):
+    if not is_authorized_user(update):
+        await update.message.reply_text("No tienes permiso para usar este bot.")
+        return
+    if not context.args:
+        await update.message.reply_text("Uso: /genero GÉNERO [días]")
+        return
+    try:
+        dias_recientes = parse_days(context.args[1:])
+    except ValueError:
+        await update.message.reply_text("Por favor, ingresa un número positivo de días.")
+        return
+    await start_sync(update, context, dias_recientes, genre=context.args[0])
+
+# /playlist URL [días]: sincroniza una sola playlist de origen (debe estar en playlists.txt)
+async def sync_playlist_command(update: Update, context):
+    if not is_authorized_user(update):
+        await update.message.reply_text("No tienes permiso para usar este bot.")
+        return
+    match = PLAYLIST_ID.search(context.args[0]) if context.args else None
+    if not match:
+        await update.message.reply_text("Uso: /playlist URL [días]")
+        return
+    try:
+        dias_recientes = parse_days(context.args[1:])
+    except ValueError:
+        await update.message.reply_text("Por favor, ingresa un número positivo de días.")
+        return
+    await start_sync(update, context, dias_recientes, playlist_id=f"spotify:playlist:{match.group(1)}")
+
+# /estado: informe de la última ejecución y canciones por género, sin llamar a Spotify
+async def status_command(update: Update, context):
+    if not is_authorized_user(update):
+        await update.message.reply_text("No tienes permiso para usar este bot.")
+        return
+    loop = asyncio.get_running_loop()
+    # Se lee en un hilo aparte del de las actualizaciones para contestar aunque haya una en curso
+    text = await loop.run_in_executor(None, build_status)
+    if sync_task and not sync_task.done():
+        text = "Hay una actualización en curso.\n\n" + text
+    await update.message.reply_text(text)
+
+# /cancelar: pide a la actualización en curso que se detenga
+async def cancel_command(update: Update, context):
+    if not is_authorized_user(update):
+        await update.message.reply_text("No tienes permiso para usar este bot.")
+        return
+    if not sync_task or sync_task.done():
+        await update.message.reply_text("No hay ninguna actualización en curso.")
+        return
+    cancel_event.set()
+    await update.message.reply_text("Cancelando: los géneros en marcha terminan lo que estén escribiendo y no se empiezan más.")
+
+# Lanza una actualización (completa, de un género o de una playlist) si no hay otra en curso
+async def start_sync(update, context, dias_recientes, genre=None, playlist_id=None):
+    global sync_task
+    if sync_task and not sync_task.done():
+        await update.message.reply_text("Ya hay una actualización en curso, espera a que termine.")
+        return
+
+    target = f" de {genre.upper()}" if genre else " de la playlist" if playlist_id else ""
+    status_message = await update.message.reply_text(f"Comenzando la actualización{target} de novedades para los últimos {dias_recientes} días...")
+
+    # Lanzar la actualización en segundo plano; el manejador termina enseguida y el bot sigue respondiendo
+    cancel_event.clear()
+    sync_task = context.application.create_task(run_sync_job(status_message, dias_recientes, genre, playlist_id))
+
+# Función que ejecuta SpotiBOT en el hilo de trabajo e informa del progreso editando un único mensaje
+async def run_sync_job(status_message, dias_recientes, genre=None, playlist_id=None):
+    loop = asyncio.get_running_loop()
+    header = f"Actualizando novedades de los últimos {dias_recientes} días...\n"
+    edit_lock = asyncio.Lock()  # Las ediciones se aplican en el orden en que se pidieron
+
+    async def edit_status(text):
+        async with edit_lock:
+            try:
+                await status_message.edit_text(text)
+            except Exception as e:  # p. ej. "message is not modified"
+                logger.warning(f"No se pudo actualizar el mensaje de estado: {e}")
+
+    def progress(text):
+        # Se llama desde el hilo de trabajo: la edición se programa en el event loop del bot
+        asyncio.run_coroutine_threadsafe(edit_status(header + text), loop)
 
     # Llamar la función principal de SpotiBOT
-    result = run_spotibot(dias_recientes)
+    result = await loop.run_in_executor(sync_executor, run_spotibot, dias_recientes, progress, genre, playlist_id)
 
     # Enviar el resultado de SpotiBOT al usuario
-    await update.message.reply_text(result)
+    await edit_status(result)
 
-# Función para ejecutar SpotiBOT
-def run_spotibot(dias_recientes):
-    try:
-        # Autenticación de Spotify
-        global sp, user_id, user_name
-        sp = authenticate_spotify()
-        user_id = sp.current_user()["id"]
-        user_name = sp.current_user()["display_name"]
+# Función para procesar un género: junta las novedades de sus playlists y las añade de una vez.
+# Devuelve cuántas canciones se añadieron (para el informe) y apunta en 'targets' el nombre de la playlist de destino
+def process_genre_for_bot(ctx, genre, playlists, targets=None):
+    writer = ctx.writer
+    genre_playlist_id, genre_playlist_name, target_ids, target_keys = get_target_playlist(ctx, genre)
+    if targets is not None:
+        targets[genre] = genre_playlist_name
+    with ctx.metrics.stage("cover"):
+        set_playlist_image(ctx.sp, genre_playlist_id, genre, ctx.covers)
+    tracks_by_playlist = ctx.fetch_sources(genre, playlists)
 
-        # Cargar playlists desde el archivo
-        playlists_by_genre = load_playlists("playlists.txt")
-        if not playlists_by_genre:
-            return "No se encontraron playlists válidas en 'playlists.txt'."
+    # Novedades de todas las playlists del género, sin repetir y reservadas en el registro global
+    # (misma selección que spotibot_core.process_genre; otros géneros van en paralelo)
+    with ctx.metrics.stage("filter") as stage:
+        sources = [(playlist["id"], tracks_by_playlist[playlist["id"]]) for playlist in playlists]
+        selected, _ = ctx.select_new_tracks(genre, sources, target_ids, target_keys)
+        unique_tracks = [track for playlist_id, _ in sources for track in selected[playlist_id]]
+        stage.items = sum(len(tracks) for _, tracks in sources)
 
-        # Cargar el registro global
-        global_tracks_path = "global_tracks.txt"
-        global_track_ids = load_global_tracks(global_tracks_path)
+    if unique_tracks:
+        tracks = [(track.id, track.uri, track_key(track)) for track in unique_tracks]
 
-        # Procesar las playlists por género
-        result_message = ""
-        for genre, playlists in playlists_by_genre.items():
-            genre_playlist_id, genre_playlist_name = get_or_create_genre_playlist(sp, user_id, genre)
-            set_playlist_image(sp, genre_playlist_id, genre)
+        # Agregar canciones a la lista de reproducción por lotes; cada lote confirmado
+        # se guarda en el registro global y en el histórico local
+        scopes = [GLOBAL_SCOPE, genre_scope(genre)]
+        try:
+            with ctx.metrics.stage("add") as stage:
+                stage.items = writer.add_tracks(genre_playlist_id, tracks, scopes)
+        except Exception:
+            ctx.release_tracks(unique_tracks)
+            raise
 
-            all_new_tracks = []
+    # Marcar como procesada la versión actual de las playlists descargadas sin errores
+    for playlist in playlists:
+        ctx.mark_processed(genre, playlist["id"])
+    return len(unique_tracks)
 
-            # Obtener canciones de las playlists para ese género
-            for playlist in playlists:
-                old_tracks_path = f"data/{playlist['id'].split(':')[-1]}_tracks.txt"
-                old_tracks = load_old_tracks(old_tracks_path)
+# Reduce las playlists de playlists.txt a un género o a una playlist de origen
+def select_playlists(playlists_by_genre, genre=None, playlist_id=None):
+    if genre:
+        return {name: playlists for name, playlists in playlists_by_genre.items() if name.lower() == genre.lower()}
+    if playlist_id:
+        selected = {name: [playlist for playlist in playlists if playlist["id"] == playlist_id]
+                    for name, playlists in playlists_by_genre.items()}
+        return {name: playlists for name, playlists in selected.items() if playlists}
+    return playlists_by_genre
 
-                current_tracks = get_playlist_tracks(sp, playlist["id"])
-                new_tracks = filter_new_tracks(old_tracks, current_tracks)
-                recent_tracks = filter_recent_tracks(new_tracks, dias_recientes)
-                unique_tracks = filter_duplicate_tracks(recent_tracks, global_track_ids)
+# Texto de /estado: data/last_run.json y el historial local (data/spotibot.db)
+def build_status():
+    config = load_config()
+    report = JsonState(config.get("SPOTIBOT_REPORT_FILE", REPORT_FILE)).data
+    if report:
+        api_calls = report.get("api", {}).get("total_calls")
+        lines = [f"Última ejecución: {report.get('finished_at', '?')} ({report.get('status', '?')}, "
+                 f"{report.get('duration_seconds', 0):.0f}s" + (f", {api_calls} llamadas a la API)" if api_calls is not None else ")")]
+        for genre, entry in report.get("genres", {}).items():
+            lines.append(f"  {genre.upper()}: " + (f"error: {entry['error']}" if "error" in entry else f"{entry.get('added', 0)} canciones añadidas"))
+    else:
+        lines = ["Todavía no hay ninguna ejecución registrada."]
 
-                all_new_tracks.extend(unique_tracks)
+    store = TrackStore()
+    try:
+        lines.append("\nHistorial local:")
+        for genre in load_playlists("playlists.txt"):
+            lines.append(f"  {genre.upper()}: {store.count(genre_scope(genre))} canciones")
+        lines.append(f"Total: {store.count(GLOBAL_SCOPE)} canciones distintas")
+    finally:
+        store.close()
+    return "\n".join(lines)
+
+# Función para ejecutar SpotiBOT (todo playlists.txt, o solo un género o una playlist de origen)
+def run_spotibot(dias_recientes, progress=None, genre=None, playlist_id=None):
+    try:
+        # Autenticación de Spotify (solo la primera vez; después se reutiliza el mismo cliente)
+        global sp, user_id, user_name, client_manager
+        metrics = RunMetrics()
+        with metrics.stage("auth"):
+            if client_manager is None:
+                client_manager = SpotifyClientManager(load_config())
+            sp = client_manager.get_client()
+            metrics.track_api(sp.scheduler)
+            user = client_manager.current_user()
+        user_id = user["id"]
+        user_name = user["display_name"]
 
-            # Eliminar duplicados entre playlists
-            unique_tracks = {track['track']['id']: track for track in all_new_tracks}.values()
+        # Cargar playlists desde el archivo
+        playlists_by_genre = load_playlists("playlists.txt")
+        if not playlists_by_genre:
+            return "No se encontraron playlists válidas en 'playlists.txt'."
+        playlists_by_genre = select_playlists(playlists_by_genre, genre, playlist_id)
+        if not playlists_by_genre:
+            return f"El género '{genre}' no está en 'playlists.txt'." if genre else "Esa playlist no está en 'playlists.txt'."
 
-            if unique_tracks:
-                track_ids = [track['track']['id'] for track in unique_tracks]
+        # Procesar varios géneros a la vez, informando según va terminando cada uno
+        config = load_config()
+        ctx = SyncContext(sp, user_id, config, dias_recientes, metrics, cancel=cancel_event)
+        targets = {}  # género -> nombre de su playlist de destino
+        finished = []
 
-                # Agregar canciones a la lista de reproducción por lotes
-                batch_size = 100
-                for i in range(0, len(track_ids), batch_size):
-                    batch = track_ids[i:i + batch_size]
-                    sp.playlist_add_items(genre_playlist_id, batch)
+        def on_genre_done(genre, result):
+            finished.append(genre)
+            if progress:
+                progress(f"{len(finished)}/{len(playlists_by_genre)} géneros procesados (último: {genre}).")
 
-                # Guardar en el registro global y el histórico local
-                save_global_tracks([track['track']['id'] for track in unique_tracks], global_tracks_path)
-                for playlist in playlists:
-                    old_tracks_path = f"data/{playlist['id'].split(':')[-1]}_tracks.txt"
-                    save_new_tracks(old_tracks_path, unique_tracks)
+        try:
+            ctx.start()
+            results = run_genres(ctx, playlists_by_genre, functools.partial(process_genre_for_bot, targets=targets),
+                                 int(config.get("SPOTIBOT_GENRE_WORKERS", GENRE_WORKERS)), on_genre_done)
+        finally:
+            ctx.close()
+            ctx.write_report()
 
-                result_message += f"{genre.upper()} {datetime.date.today().year}: {len(unique_tracks)} canciones nuevas agregadas.\n"
+        result_message = "Actualización cancelada.\n" if cancel_event.is_set() else ""
+        for genre, result in results.items():
+            if isinstance(result, SyncCancelled):
+                result_message += f"{genre.upper()}: cancelado.\n"
+            elif isinstance(result, Exception):
+                result_message += f"{genre.upper()}: Error al procesar el género: {result}\n"
+            elif result:
+                result_message += f"{targets[genre]}: {result} canciones nuevas agregadas.\n"
             else:
-                result_message += f"{genre.upper()} {datetime.date.today().year}: No se encontraron canciones nuevas.\n"
-
+                result_message += f"{targets[genre]}: No se encontraron canciones nuevas.\n"
+        if ctx.fetcher.errors:
+            result_message += f"Aviso: {len(ctx.fetcher.errors)} playlists no se pudieron descargar completas, se reintentarán en la próxima ejecución.\n"
         return result_message
 
     except Exception as e:
@@ -139,6 +318,10 @@ async def main():
 
     # Añadir manejadores de comandos y mensajes
     application.add_handler(CommandHandler("start", start))
+    application.add_handler(CommandHandler("genero", sync_genre_command))
+    application.add_handler(CommandHandler("playlist", sync_playlist_command))
+    application.add_handler(CommandHandler("estado", status_command))
+    application.add_handler(CommandHandler("cancelar", cancel_command))
     application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
 
     # Ejecutar el bot de manera continua
@@ -0,0 +1,99 @@
+############# EXPLICACION ##############
+# Microbenchmark del filtrado de novedades (sin red): compara la versión anterior con strptime en tres
+# pasadas, la cadena de generadores filter_* de spotibot_core.py y select_tracks de spotibot_filters.py.
+#   python bench/bench_filters.py --items 100000 --repeat 5
+import argparse
+import contextlib
+import datetime
+import io
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from spotibot_core import filter_duplicate_tracks, filter_new_tracks, filter_recent_tracks  # noqa: E402
+from spotibot_fetch import TrackItem  # noqa: E402
+from spotibot_filters import select_tracks  # noqa: E402
+from spotibot_state import cutoff_timestamp  # noqa: E402
+
+
+# === Versión anterior (referencia): tres listas y strptime por canción ===
+def strptime_three_pass(current_tracks, old_ids, days, excluded_ids):
+    new_tracks = [track for track in current_tracks if track.id and track.id not in old_ids]
+    recent_tracks = []
+    cutoff_date = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=days)
+    for track in new_tracks:
+        if not track.added_at:
+            continue
+        try:
+            added_at = datetime.datetime.strptime(track.added_at, '%Y-%m-%dT%H:%M:%SZ')
+            added_at = added_at.replace(tzinfo=datetime.timezone.utc)
+        except ValueError:
+            continue
+        if added_at >= cutoff_date:
+            recent_tracks.append(track)
+    return [track for track in recent_tracks if track.id and track.id not in excluded_ids]
+
+
+def filter_chain(current_tracks, old_ids, days, excluded_ids):
+    new_tracks = filter_new_tracks(old_ids, current_tracks)
+    recent_tracks = filter_recent_tracks(new_tracks, days)
+    return list(filter_duplicate_tracks(recent_tracks, excluded_ids))
+
+
+def single_pass(current_tracks, old_ids, days, excluded_ids):
+    return select_tracks(current_tracks, cutoff_timestamp(days), old_ids | excluded_ids)
+
+
+VARIANTS = [("strptime (3 pasadas)", strptime_three_pass), ("filter_* encadenados", filter_chain),
+            ("select_tracks", single_pass)]
+
+
+def make_tracks(count, span_days, seed):
+    rng = random.Random(seed)
+    now = datetime.datetime.now(datetime.timezone.utc)
+    tracks = []
+    for i in range(count):
+        added_at = (now - datetime.timedelta(days=rng.uniform(0, span_days))).strftime('%Y-%m-%dT%H:%M:%SZ')
+        track_id = f"{rng.randrange(count * 2):022d}"
+        tracks.append(TrackItem(track_id, f"spotify:track:{track_id}", added_at, f"Canción {i}"))
+    return tracks
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmark del filtrado de novedades.")
+    parser.add_argument("--items", type=int, default=100000)
+    parser.add_argument("--span-days", type=int, default=60, help="Antigüedad máxima de las canciones")
+    parser.add_argument("--days", type=int, default=7)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    tracks = make_tracks(args.items, args.span_days, args.seed)
+    old_ids = {track.id for track in tracks[::4]}
+    excluded_ids = {track.id for track in tracks[1::10]}
+
+    results = {}
+    print(f"{args.items} canciones, ventana de {args.days} días, mejor de {args.repeat} repeticiones")
+    for name, fn in VARIANTS:
+        best = float("inf")
+        for _ in range(args.repeat):
+            with contextlib.redirect_stdout(io.StringIO()):
+                start = time.perf_counter()
+                selected = fn(tracks, old_ids, args.days, excluded_ids)
+                best = min(best, time.perf_counter() - start)
+        results[name] = {track.id for track in selected}
+        print(f"{name:<24}{best * 1000:>10.1f} ms{len(selected):>10} canciones")
+
+    # Todas las variantes deben elegir las mismas canciones
+    reference = results[VARIANTS[0][0]]
+    for name, selected in results.items():
+        if selected != reference:
+            print(f"Aviso: '{name}' selecciona canciones distintas a la versión anterior.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,382 @@
+############# EXPLICACION ##############
+# Servidor local que imita la parte de la API web de Spotify que usa SpotiBOT.
+# Sirve playlists sintéticas (tamaño, orden y fechas 'added_at' configurables), simula latencia y
+# respuestas 429, y cuenta las llamadas por endpoint. bench/run_benchmarks.py lo arranca en un proceso aparte
+# (para no mezclar su memoria y CPU con las de SpotiBOT) y lo prepara a través de las rutas /__bench__/.
+import argparse
+import datetime
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+MAX_PAGE_SIZE = 100
+MARKETS = ["AD", "AR", "AT", "AU", "BE", "BG", "BO", "BR", "CA", "CH", "CL", "CO", "CR", "CY", "CZ", "DE", "DK",
+           "DO", "EC", "EE", "ES", "FI", "FR", "GB", "GR", "GT", "HK", "HN", "HU", "ID", "IE", "IS", "IT", "JP",
+           "LI", "LT", "LU", "LV", "MC", "MT", "MX", "MY", "NI", "NL", "NO", "NZ", "PA", "PE", "PH", "PL", "PT"]
+
+
+# === Datos sintéticos ===
+def make_track(track_number, isrc_pool=None):
+    """Objeto track con la forma (y el peso) de uno real de la API."""
+    track_id = f"{track_number:022d}"
+    isrc = f"ES{(track_number % isrc_pool if isrc_pool else track_number):010d}"
+    artist = {"id": f"artist{track_number % 500}", "name": f"Artista {track_number % 500}",
+              "type": "artist", "uri": f"spotify:artist:artist{track_number % 500}",
+              "external_urls": {"spotify": f"https://open.spotify.com/artist/artist{track_number % 500}"}}
+    return {
+        "id": track_id,
+        "uri": f"spotify:track:{track_id}",
+        "name": f"Canción {track_number}",
+        "type": "track",
+        "duration_ms": 180000 + track_number % 60000,
+        "explicit": False,
+        "popularity": track_number % 100,
+        "external_ids": {"isrc": isrc},
+        "external_urls": {"spotify": f"https://open.spotify.com/track/{track_id}"},
+        "available_markets": MARKETS,
+        "artists": [artist],
+        "album": {
+            "id": f"album{track_number // 10}",
+            "name": f"Álbum {track_number // 10}",
+            "album_type": "single",
+            "release_date": "2026-01-01",
+            "available_markets": MARKETS,
+            "artists": [artist],
+            "images": [{"url": f"https://i.scdn.co/image/{track_number}-{size}", "height": size, "width": size}
+                       for size in (640, 300, 64)],
+        },
+    }
+
+
+def make_items(size, track_pool, span_days, order="chronological", now=None, seed=0, isrc_pool=None):
+    """Items de playlist repartidos en los últimos 'span_days' días.
+
+    order: "chronological" (como Spotify por defecto), "shuffled" o "recent-heavy" (la mitad en la última semana).
+    isrc_pool: si se indica, canciones con distinto ID comparten ISRC (la misma grabación en varios lanzamientos).
+    """
+    rng = random.Random(seed)
+    now = now or datetime.datetime.now(datetime.timezone.utc)
+    if order == "recent-heavy":
+        ages = [rng.uniform(0, 7) if i % 2 else rng.uniform(7, span_days) for i in range(size)]
+    else:
+        ages = [rng.uniform(0, span_days) for _ in range(size)]
+    if order != "shuffled":
+        ages.sort(reverse=True)  # De más antiguo a más reciente
+    track_numbers = [rng.randrange(track_pool) for _ in range(size)]
+    return [{"added_at": (now - datetime.timedelta(days=age)).strftime('%Y-%m-%dT%H:%M:%SZ'),
+             "added_by": {"id": "curator", "type": "user"},
+             "is_local": False,
+             "track": make_track(number, isrc_pool)} for age, number in zip(ages, track_numbers)]
+
+
+# === Filtro 'fields' de la API (subconjunto suficiente: a,b(c,d.e),f) ===
+def parse_fields(fields):
+    def parse(text, pos):
+        result = {}
+        name = ""
+        while pos < len(text):
+            char = text[pos]
+            if char == ",":
+                if name:
+                    _set_path(result, name, None)
+                name = ""
+            elif char == "(":
+                sub, pos = parse(text, pos + 1)
+                _set_path(result, name, sub)
+                name = ""
+            elif char == ")":
+                break
+            else:
+                name += char
+            pos += 1
+        if name:
+            _set_path(result, name, None)
+        return result, pos
+    return parse(fields.replace(" ", ""), 0)[0]
+
+
+def _set_path(result, dotted, value):
+    parts = dotted.split(".")
+    for part in parts[:-1]:
+        result = result.setdefault(part, {})
+    result[parts[-1]] = value
+
+
+def apply_fields(data, spec):
+    if spec is None:
+        return data
+    if isinstance(data, list):
+        return [apply_fields(item, spec) for item in data]
+    if not isinstance(data, dict):
+        return data
+    return {key: apply_fields(data[key], sub) for key, sub in spec.items() if key in data}
+
+
+# === Servidor ===
+class FakeSpotifyAPI:
+    """API falsa en 127.0.0.1 con contadores por endpoint."""
+
+    def __init__(self, latency=0.0, error_rate=0.0, retry_after=0.05, page_size=MAX_PAGE_SIZE, seed=0):
+        self.latency = latency
+        self.page_size = min(page_size, MAX_PAGE_SIZE)  # Tamaño máximo de página que devuelve el servidor
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.user = {"id": "benchuser", "display_name": "Bench"}
+        self.playlists = {}  # id -> {"name", "owner", "items", "snapshot"}
+        self.counters = {}
+        self.throttled = 0
+        self.not_modified = 0  # Respuestas 304 a GET condicionales
+        self.created = 0
+        self.isrc_pool = None
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server.server_address[1]}/v1/"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def add_playlist(self, playlist_id, items, name=None, owner=None):
+        with self.lock:
+            self.playlists[playlist_id] = {"name": name or playlist_id, "owner": owner or "curator",
+                                           "items": items, "snapshot": 1}
+
+    def add_library(self, count):
+        """Playlists de relleno en la biblioteca del usuario (para get_or_create_genre_playlist)."""
+        for i in range(count):
+            self.add_playlist(f"library{i:06d}", [], name=f"Playlist de relleno {i}", owner=self.user["id"])
+
+    def reset_counters(self):
+        with self.lock:
+            self.counters = {}
+            self.throttled = 0
+            self.not_modified = 0
+
+    def total_calls(self):
+        with self.lock:
+            return sum(self.counters.values())
+
+    def counters_snapshot(self):
+        with self.lock:
+            return {"calls": dict(self.counters), "throttled": self.throttled, "not_modified": self.not_modified}
+
+    # === Rutas de control (no cuentan como llamadas a la API) ===
+    def _control(self, method, path, body):
+        if method == "POST" and path == "playlists":
+            self.isrc_pool = body.get("isrc_pool") or None
+            items = make_items(body["size"], body.get("track_pool", 10 * body["size"]), body.get("span_days", 30),
+                               body.get("order", "chronological"), seed=body.get("seed", 0), isrc_pool=self.isrc_pool)
+            self.add_playlist(body["id"], items, name=body.get("name"), owner=body.get("owner"))
+            return 201, {"id": body["id"], "size": len(items)}
+        if method == "POST" and path == "library":
+            self.add_library(body["count"])
+            return 201, {"count": body["count"]}
+        if method == "POST" and path == "reset":
+            self.reset_counters()
+            if body.get("playlists"):
+                with self.lock:
+                    self.playlists = {}
+            return 200, {}
+        if method == "GET" and path == "counters":
+            return 200, self.counters_snapshot()
+        if method == "POST" and path == "expected":
+            # Items de la playlist (todos o los añadidos desde 'since') para comprobar lo que descargó SpotiBOT
+            with self.lock:
+                items = self.playlists.get(body["id"].rsplit(":", 1)[-1], {}).get("items", [])
+                since = body.get("since") or ""
+                return 200, {"count": sum(1 for item in items if item["added_at"] >= since)}
+        return 404, {"error": {"status": 404, "message": "Not found"}}
+
+    # === Rutas ===
+    def _route(self, method, path, query, body):
+        base = self.url.rstrip("/")
+        page_args = lambda default: (min(int(query.get("limit", [default])[0]), self.page_size),  # noqa: E731
+                                     int(query.get("offset", ["0"])[0]))
+
+        if method == "GET" and path in ("me", "me/"):
+            return "me", 200, self.user
+        if method == "GET" and path == "me/playlists":
+            limit, offset = page_args(20)
+            with self.lock:
+                owned = [(pid, p) for pid, p in self.playlists.items() if p["owner"] == self.user["id"]]
+            page = [{"id": pid, "name": p["name"], "snapshot_id": str(p["snapshot"]),
+                     "owner": {"id": p["owner"]}, "tracks": {"total": len(p["items"])}}
+                    for pid, p in owned[offset:offset + limit]]
+            next_url = f"{base}/me/playlists?limit={limit}&offset={offset + limit}" if offset + limit < len(owned) else None
+            return "me/playlists", 200, {"items": page, "total": len(owned), "limit": limit, "offset": offset, "next": next_url}
+        if method == "GET" and path.startswith("tracks"):
+            ids = query.get("ids", [""])[0].split(",")
+            if len(ids) > 50:
+                return "tracks", 400, {"error": {"status": 400, "message": "Too many ids requested"}}
+            return "tracks", 200, {"tracks": [make_track(int(tid), self.isrc_pool) if tid.isdigit() else None
+                                              for tid in ids]}
+        match = re.fullmatch(r"users/([^/]+)/playlists", path)
+        if method == "POST" and match:
+            with self.lock:
+                self.created += 1
+                playlist_id = f"created{self.created:06d}"
+            self.add_playlist(playlist_id, [], name=body.get("name"), owner=self.user["id"])
+            return "users/playlists", 201, {"id": playlist_id, "name": body.get("name"), "snapshot_id": "1"}
+
+        match = re.fullmatch(r"playlists/([^/]+)(/(items|tracks|images))?", path)
+        if not match:
+            return "desconocido", 404, {"error": {"status": 404, "message": "Not found"}}
+        playlist_id, sub = match.group(1), match.group(3)
+        with self.lock:
+            playlist = self.playlists.get(playlist_id)
+        if playlist is None:
+            return f"playlists/{sub or ''}", 404, {"error": {"status": 404, "message": "Not found"}}
+
+        if sub is None and method == "GET":
+            data = {"id": playlist_id, "name": playlist["name"], "snapshot_id": str(playlist["snapshot"]),
+                    "tracks": {"total": len(playlist["items"])}}
+            fields = query.get("fields", [None])[0]
+            return "playlists", 200, apply_fields(data, parse_fields(fields) if fields else None)
+        if sub is None and method == "PUT":
+            return "playlists (PUT)", 200, {}
+        if sub == "images":
+            return "playlists/images", 202, {}
+        if method == "GET":
+            limit, offset = page_args(100)
+            items = playlist["items"]
+            next_url = (f"{base}/playlists/{playlist_id}/items?limit={limit}&offset={offset + limit}"
+                        if offset + limit < len(items) else None)
+            data = {"items": items[offset:offset + limit], "total": len(items), "limit": limit,
+                    "offset": offset, "next": next_url}
+            fields = query.get("fields", [None])[0]
+            if fields:
+                data = apply_fields(data, parse_fields(fields))
+                data.setdefault("next", next_url)  # spotipy.next() lo necesita
+            return "playlists/items", 200, data
+        now = datetime.datetime.now(datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+        if method == "POST":
+            uris = body if isinstance(body, list) else body.get("uris", [])
+            if len(uris) > MAX_PAGE_SIZE:
+                return "playlists/items (POST)", 400, {"error": {"status": 400, "message": "Too many ids requested"}}
+            with self.lock:
+                playlist["items"].extend({"added_at": now, "track": make_track(int(uri.split(":")[-1]), self.isrc_pool)}
+                                         for uri in uris)
+                playlist["snapshot"] += 1
+                return "playlists/items (POST)", 201, {"snapshot_id": str(playlist["snapshot"])}
+        if method == "DELETE":
+            uris = {entry["uri"] for entry in body.get("items", body.get("tracks", []))}
+            with self.lock:
+                playlist["items"] = [item for item in playlist["items"] if item["track"]["uri"] not in uris]
+                playlist["snapshot"] += 1
+                return "playlists/items (DELETE)", 200, {"snapshot_id": str(playlist["snapshot"])}
+        return "desconocido", 405, {"error": {"status": 405, "message": "Method not allowed"}}
+
+    def _handler(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _serve(self, method):
+                parsed = urlparse(self.path)
+                path = parsed.path[len("/v1/"):] if parsed.path.startswith("/v1/") else parsed.path.lstrip("/")
+                length = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(length) if length else b""
+                try:
+                    body = json.loads(raw) if raw and self.headers.get("Content-Type") == "application/json" else {}
+                except ValueError:
+                    body = {}
+                if path.startswith("__bench__/"):
+                    status, data = api._control(method, path[len("__bench__/"):], body)
+                    self._send(status, data, {})
+                    return
+                if api.latency:
+                    time.sleep(api.latency)
+                with api.lock:
+                    throttle = api.error_rate and api.rng.random() < api.error_rate
+                if throttle:
+                    with api.lock:
+                        api.throttled += 1
+                    status, data, headers = 429, {"error": {"status": 429, "message": "API rate limit exceeded"}}, {
+                        "Retry-After": str(api.retry_after)}
+                    endpoint = "429"
+                else:
+                    endpoint, status, data = api._route(method, path, parse_qs(parsed.query), body)
+                    headers = {}
+                with api.lock:
+                    api.counters[endpoint] = api.counters.get(endpoint, 0) + 1
+                if method == "GET" and status == 200:
+                    # ETag del cuerpo como en la API real; si el cliente ya lo tiene se contesta 304 sin cuerpo
+                    payload = json.dumps(data).encode()
+                    etag = f'"{hashlib.sha1(payload).hexdigest()}"'
+                    if self.headers.get("If-None-Match") == etag:
+                        with api.lock:
+                            api.not_modified += 1
+                        self.send_response(304)
+                        self.send_header("ETag", etag)
+                        self.end_headers()
+                        return
+                    headers = {**headers, "ETag": etag}
+                self._send(status, data, headers)
+
+            def _send(self, status, data, headers):
+                payload = json.dumps(data).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_GET(self):
+                self._serve("GET")
+
+            def do_POST(self):
+                self._serve("POST")
+
+            def do_PUT(self):
+                self._serve("PUT")
+
+            def do_DELETE(self):
+                self._serve("DELETE")
+
+        return Handler
+
+
+# === Ejecución como proceso independiente ===
+def main():
+    parser = argparse.ArgumentParser(description="API falsa de Spotify para los benchmarks de SpotiBOT.")
+    parser.add_argument("--latency", type=float, default=0.0, help="Segundos de espera por petición")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Probabilidad de responder 429")
+    parser.add_argument("--retry-after", type=float, default=0.05, help="Valor de la cabecera Retry-After")
+    parser.add_argument("--page-size", type=int, default=MAX_PAGE_SIZE, help="Tamaño máximo de página")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    api = FakeSpotifyAPI(args.latency, args.error_rate, args.retry_after, args.page_size, args.seed)
+    print(api.url, flush=True)  # El runner lee la URL de la primera línea
+    try:
+        api.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        api.server.server_close()
+
+
+if __name__ == "__main__":
+    main()
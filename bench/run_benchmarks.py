@@ -0,0 +1,369 @@
+############# EXPLICACION ##############
+# Benchmarks de SpotiBOT contra la API falsa de bench/fake_spotify_api.py (no se toca la API real).
+# Cada escenario se ejecuta en un directorio temporal (data/, historial, cachés) y mide llamadas a la API,
+# tiempo total y pico de memoria. Ejemplo:
+#   python bench/run_benchmarks.py --playlist-size 3000 --latency 0.02 --error-rate 0.02
+#   python bench/run_benchmarks.py --scenarios main,main_rerun --json resultados.json
+import argparse
+import contextlib
+import functools
+import io
+import json
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import spotipy  # noqa: E402
+
+import spotibot_core  # noqa: E402
+from spotibot_client import SpotifyClientManager  # noqa: E402
+from spotibot_daemon import SyncDaemon  # noqa: E402
+from spotibot_fetch import PlaylistFetcher  # noqa: E402
+from spotibot_filters import select_tracks  # noqa: E402
+from spotibot_scheduler import RequestScheduler, ScheduledSpotify  # noqa: E402
+from spotibot_state import PlaylistIndex, cutoff_timestamp  # noqa: E402
+
+ERROR_MARKERS = ("Error al procesar el género", "Error al obtener canciones")  # Fallos que solo se imprimen
+SCENARIOS = ["fetch", "fetch_recent", "filters", "genre_playlist", "main", "main_rerun", "daemon", "bot"]
+
+
+# === Servidor falso en un proceso aparte ===
+class FakeServer:
+    def __init__(self, args):
+        command = [sys.executable, os.path.join(ROOT, "bench", "fake_spotify_api.py"),
+                   "--latency", str(args.latency), "--error-rate", str(args.error_rate),
+                   "--retry-after", str(args.retry_after), "--page-size", str(args.page_size), "--seed", str(args.seed)]
+        self.process = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+        self.url = self.process.stdout.readline().strip()
+        if not self.url:
+            raise RuntimeError("No se pudo arrancar la API falsa.")
+
+    def control(self, path, body=None):
+        data = json.dumps(body).encode() if body is not None else None
+        request = urllib.request.Request(self.url + "__bench__/" + path, data=data,
+                                         headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(request) as response:
+            return json.loads(response.read())
+
+    def stop(self):
+        self.process.terminate()
+        self.process.wait()
+
+
+# === Cliente apuntando a la API falsa ===
+class BenchClientManager(SpotifyClientManager):
+    """Igual que el cliente real (misma sesión y planificador) pero sin OAuth y contra la API falsa."""
+
+    def __init__(self, config, url):
+        super().__init__(config)
+        self.url = url
+
+    def get_client(self):
+        with self.lock:
+            if self.client is None:
+                sp = spotipy.Spotify(auth="bench-token", requests_session=self._build_session())
+                sp.prefix = self.url
+                self.client = ScheduledSpotify(sp, RequestScheduler.from_config(self.config))
+                self.client.scheduler.http_cache = self.http_cache
+            return self.client
+
+
+def bench_config(args):
+    return {"SPOTIPY_CLIENT_ID": "bench", "SPOTIPY_CLIENT_SECRET": "bench",
+            "SPOTIPY_REDIRECT_URI": "http://localhost:8888/callback",
+            "SPOTIBOT_RATE_LIMIT": str(args.rate_limit)}
+
+
+# === Datos de cada escenario ===
+def setup_sources(server, args):
+    """Crea genres x playlists-per-genre playlists de origen y devuelve el contenido de playlists.txt."""
+    lines = []
+    for g in range(args.genres):
+        for p in range(args.playlists_per_genre):
+            playlist_id = f"src{g:03d}{p:03d}"
+            server.control("playlists", {"id": playlist_id, "size": args.playlist_size, "track_pool": args.track_pool,
+                                         "span_days": args.span_days, "order": args.order, "seed": g * 1000 + p,
+                                         "isrc_pool": args.isrc_pool})
+            lines.append(f"https://open.spotify.com/playlist/{playlist_id}?si=bench GENERO_{g}")
+    server.control("library", {"count": args.library})
+    return "\n".join(lines) + "\n"
+
+
+def check_count(server, playlist_id, items, since=None):
+    """Falla si SpotiBOT descargó menos items (desde 'since') de los que tiene la playlist en la API falsa."""
+    expected = server.control("expected", {"id": playlist_id, "since": since})["count"]
+    found = sum(1 for item in items if since is None or item.added_at >= since)
+    if found != expected:
+        raise RuntimeError(f"Se descargaron {found} de {expected} canciones de la playlist {playlist_id}")
+
+
+@contextlib.contextmanager
+def checked_fetches(server):
+    """Comprueba cada descarga de PlaylistFetcher contra la API falsa: una página perdida cuenta como error."""
+    fetch_many, fetch_many_recent = PlaylistFetcher.fetch_many, PlaylistFetcher.fetch_many_recent
+
+    def checked_many(self, playlist_ids):
+        results = fetch_many(self, playlist_ids)
+        for playlist_id, items in results.items():
+            if playlist_id not in self.errors:
+                check_count(server, playlist_id, items)
+        return results
+
+    def checked_many_recent(self, playlist_ids, cutoff):
+        results = fetch_many_recent(self, playlist_ids, cutoff)
+        for playlist_id, items in results.items():
+            if playlist_id not in self.errors:
+                check_count(server, playlist_id, items, cutoff)
+        return results
+
+    with patched(PlaylistFetcher, fetch_many=checked_many, fetch_many_recent=checked_many_recent):
+        yield
+
+
+@contextlib.contextmanager
+def workdir():
+    """Directorio temporal con las portadas del repositorio, como si fuera la carpeta de SpotiBOT."""
+    previous = os.getcwd()
+    path = tempfile.mkdtemp(prefix="spotibot-bench-")
+    shutil.copytree(os.path.join(ROOT, "images"), os.path.join(path, "images"))
+    os.chdir(path)
+    try:
+        yield path
+    finally:
+        os.chdir(previous)
+        shutil.rmtree(path, ignore_errors=True)
+
+
+@contextlib.contextmanager
+def patched(module, **values):
+    saved = {name: getattr(module, name) for name in values}
+    for name, value in values.items():
+        setattr(module, name, value)
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            setattr(module, name, value)
+
+
+# === Escenarios ===
+def scenario_fetch(server, args, state):
+    server.control("playlists", {"id": "big", "size": args.playlist_size, "track_pool": args.track_pool,
+                                 "span_days": args.span_days, "order": args.order})
+    sp = BenchClientManager(bench_config(args), server.url).get_client()
+    server.control("reset", {})
+    return lambda: state.__setitem__("tracks", spotibot_core.get_playlist_tracks(sp, "big")), sp
+
+
+def scenario_fetch_recent(server, args, state):
+    server.control("playlists", {"id": "big", "size": args.playlist_size, "track_pool": args.track_pool,
+                                 "span_days": args.span_days, "order": args.order})
+    sp = BenchClientManager(bench_config(args), server.url).get_client()
+    fetcher = PlaylistFetcher(sp)
+    cutoff = cutoff_timestamp(args.days)
+    server.control("reset", {})
+    return lambda: fetcher.fetch_many_recent(["big"], cutoff), sp
+
+
+def scenario_filters(server, args, state):
+    tracks = state.get("tracks")
+    if tracks is None:  # Si no se ejecutó 'fetch' antes, se descargan ahora (fuera de la medición)
+        run, _ = scenario_fetch(server, args, state)
+        run()
+        tracks = state["tracks"]
+        server.control("reset", {})
+    old_ids = {track.id for track in tracks[::3]}
+    weekly_ids = {track.id for track in tracks[1::5]}
+    cutoff = cutoff_timestamp(args.days)
+
+    def run():
+        # Igual que process_genre: una sola pasada (bench/bench_filters.py compara las variantes)
+        select_tracks(tracks, cutoff, old_ids | weekly_ids)
+    return run, None
+
+
+def scenario_genre_playlist(server, args, state):
+    server.control("library", {"count": args.library})
+    manager = BenchClientManager(bench_config(args), server.url)
+    sp = manager.get_client()
+    user_id = manager.current_user()["id"]
+    index = PlaylistIndex()
+    server.control("reset", {})
+
+    def run():
+        for g in range(args.genres):
+            spotibot_core.get_or_create_genre_playlist(sp, user_id, f"GENERO_{g}", index)
+    return run, sp
+
+
+def _main_runner(server, args, playlists_file):
+    manager = BenchClientManager(bench_config(args), server.url)
+    config = bench_config(args)
+
+    load_playlists = spotibot_core.load_playlists
+
+    def run():
+        with patched(spotibot_core, authenticate_spotify=manager.get_client, load_config=lambda *a: dict(config),
+                     load_playlists=lambda *a: load_playlists(playlists_file)):
+            spotibot_core.main(["--dias", str(args.days)])
+    return run, manager
+
+
+def scenario_main(server, args, state):
+    playlists_file = os.path.abspath("playlists.txt")
+    with open(playlists_file, "w") as f:
+        f.write(setup_sources(server, args))
+    run, manager = _main_runner(server, args, playlists_file)
+    server.control("reset", {})
+    return run, manager.get_client()
+
+
+def scenario_main_rerun(server, args, state):
+    run, sp = scenario_main(server, args, state)
+    with contextlib.redirect_stdout(io.StringIO()):
+        run()  # Primera ejecución (no se mide): la segunda debería saltarse las playlists sin cambios
+    server.control("reset", {})
+    return _main_runner(server, args, os.path.abspath("playlists.txt"))[0], None
+
+
+def scenario_daemon(server, args, state):
+    playlists_file = os.path.abspath("playlists.txt")
+    with open(playlists_file, "w") as f:
+        f.write(setup_sources(server, args))
+    manager = BenchClientManager(bench_config(args), server.url)
+    sp = manager.get_client()
+    daemon = SyncDaemon(sp, manager.current_user()["id"], bench_config(args),
+                        functools.partial(spotibot_core.load_playlists, playlists_file), args.days,
+                        spotibot_core.process_genre)
+    with contextlib.redirect_stdout(io.StringIO()):
+        daemon.run_cycle()  # Primer ciclo (no se mide)
+    daemon.schedule.data = {}  # Todo vence otra vez: se mide un ciclo con cliente y cachés ya calientes
+    server.control("reset", {})
+    return daemon.run_cycle, None
+
+
+def scenario_bot(server, args, state):
+    import TelegramSpotiBOT as bot
+
+    playlists_file = os.path.abspath("playlists.txt")
+    with open(playlists_file, "w") as f:
+        f.write(setup_sources(server, args))
+    manager = BenchClientManager(bench_config(args), server.url)
+    config = bench_config(args)
+    load_playlists = spotibot_core.load_playlists
+    server.control("reset", {})
+
+    def run():
+        with patched(bot, client_manager=manager, load_config=lambda *a: dict(config),
+                     load_playlists=lambda *a: load_playlists(playlists_file)):
+            result = bot.run_spotibot(args.days)
+        if result.startswith("Hubo un error"):
+            raise RuntimeError(result)
+    return run, manager.get_client()
+
+
+# === Medición ===
+def measure(name, server, args, state):
+    server.control("reset", {"playlists": True})
+    with workdir():
+        setup = globals()[f"scenario_{name}"]
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output if not args.verbose else sys.stdout):
+            run, sp = setup(server, args, state)
+            if args.memory:
+                tracemalloc.start()
+            start = time.perf_counter()
+            error = None
+            try:
+                with checked_fetches(server):
+                    run()
+            except Exception as e:
+                error = str(e)
+            elapsed = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1] if args.memory else 0
+            tracemalloc.stop()
+        # main() y run_spotibot() capturan los fallos de cada género (y el fetcher las descargas incompletas)
+        # y solo los muestran por pantalla
+        if error is None:
+            error = next((line for line in output.getvalue().splitlines() if any(
+                marker in line for marker in ERROR_MARKERS)), None)
+    counters = server.control("counters")
+    result = {"scenario": name, "seconds": round(elapsed, 3), "peak_mb": round(peak / 2 ** 20, 2),
+              "api_calls": sum(counters["calls"].values()), "calls": counters["calls"],
+              "throttled": counters["throttled"], "not_modified": counters["not_modified"]}
+    if sp is not None:
+        stats = sp.scheduler.stats()
+        result["retries"] = stats["retries"]
+    if error:
+        result["error"] = error
+    return result
+
+
+def print_table(results):
+    print(f"{'Escenario':<16}{'Tiempo (s)':>12}{'Pico (MB)':>12}{'Llamadas':>10}{'429':>6}  Detalle")
+    for r in results:
+        detail = r.get("error") or ", ".join(f"{k}={v}" for k, v in sorted(r["calls"].items()))
+        print(f"{r['scenario']:<16}{r['seconds']:>12.3f}{r['peak_mb']:>12.2f}{r['api_calls']:>10}{r['throttled']:>6}  {detail}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks de SpotiBOT contra una API de Spotify falsa.")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help=f"Lista separada por comas de: {', '.join(SCENARIOS)}")
+    parser.add_argument("--playlist-size", type=int, default=2000, help="Canciones por playlist de origen")
+    parser.add_argument("--track-pool", type=int, default=20000, help="Canciones distintas (controla los duplicados)")
+    parser.add_argument("--isrc-pool", type=int, default=0,
+                        help="Grabaciones distintas (0 = un ISRC por canción); menor que --track-pool simula reediciones")
+    parser.add_argument("--page-size", type=int, default=100, help="Tamaño máximo de página del servidor")
+    parser.add_argument("--order", default="chronological", choices=["chronological", "shuffled", "recent-heavy"],
+                        help="Distribución de 'added_at' en las playlists")
+    parser.add_argument("--span-days", type=int, default=365, help="Antigüedad máxima de las canciones")
+    parser.add_argument("--days", type=int, default=7, help="Días de novedades a sincronizar")
+    parser.add_argument("--genres", type=int, default=3)
+    parser.add_argument("--playlists-per-genre", type=int, default=3)
+    parser.add_argument("--library", type=int, default=200, help="Playlists propias en la biblioteca del usuario")
+    parser.add_argument("--latency", type=float, default=0.01, help="Segundos de latencia por petición")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Probabilidad de respuesta 429")
+    parser.add_argument("--retry-after", type=float, default=0.05)
+    parser.add_argument("--rate-limit", type=float, default=0, help="SPOTIBOT_RATE_LIMIT (0 = sin límite)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Guarda los resultados en este fichero")
+    parser.add_argument("--no-memory", dest="memory", action="store_false",
+                        help="No mide la memoria (tracemalloc ralentiza; útil para comparar solo tiempos)")
+    parser.add_argument("--verbose", action="store_true", help="Muestra la salida de SpotiBOT")
+    args = parser.parse_args()
+    if not args.verbose:
+        logging.getLogger("spotipy").setLevel(logging.CRITICAL)  # Los 429 simulados se cuentan en la tabla
+
+    names = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"Escenarios desconocidos: {', '.join(unknown)}")
+
+    server = FakeServer(args)
+    state = {}
+    results = []
+    try:
+        for name in names:
+            results.append(measure(name, server, args, state))
+    finally:
+        server.stop()
+
+    print_table(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"params": vars(args), "results": results}, f, indent=2)
+    if any("error" in r for r in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+############# EXPLICACION ##############
+# Sincronización de varias cuentas de Spotify a la vez, cada una en su propio proceso.
+# Cada cuenta tiene su carpeta dentro de accounts/ con su playlists.txt y, opcionalmente, su config.txt e images/;
+# su token (token_cache.json) y su historial (data/) se guardan también ahí:
+#   accounts/tienda_centro/playlists.txt
+#   accounts/tienda_centro/config.txt
+# El config.txt de la cuenta se combina con el config.txt general (manda el de la cuenta), así que
+# SPOTIPY_CLIENT_ID y compañía pueden ir solo en el general.
+# El límite de peticiones de Spotify es por aplicación: si la cuenta no fija su SPOTIBOT_RATE_LIMIT, el de su
+# aplicación (CLIENT_ID) se reparte entre las cuentas que la comparten y pueden sincronizarse a la vez.
+#   python spotibot_accounts.py --authorize tienda_centro   (la primera vez, para guardar el token)
+#   python spotibot_accounts.py --dias 7 [--workers 4] [cuenta ...]
+import argparse
+import contextlib
+import os
+import sys
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from spotibot_client import TOKEN_CACHE, SpotifyClientManager
+from spotibot_core import load_config, load_playlists, run_sync
+from spotibot_metrics import RunMetrics
+from spotibot_scheduler import RATE_LIMIT
+
+ACCOUNTS_DIR = "accounts"  # Carpeta con una subcarpeta por cuenta (SPOTIBOT_ACCOUNTS_DIR)
+ACCOUNT_WORKERS = os.cpu_count() or 2  # Cuentas sincronizadas a la vez (SPOTIBOT_ACCOUNT_WORKERS)
+LOG_FILE = "spotibot.log"  # Salida de la última ejecución, dentro de la carpeta de cada cuenta
+
+
+# === Cuentas y configuración ===
+def list_accounts(accounts_dir):
+    """Nombres de las subcarpetas de 'accounts_dir' que tienen playlists.txt."""
+    if not os.path.isdir(accounts_dir):
+        raise FileNotFoundError(f"La carpeta de cuentas '{accounts_dir}' no existe.")
+    return sorted(name for name in os.listdir(accounts_dir)
+                  if os.path.isfile(os.path.join(accounts_dir, name, "playlists.txt")))
+
+
+def load_account_configs(base_config, accounts_dir, names):
+    """{cuenta: (configuración combinada, configuración propia de la cuenta)}"""
+    configs = {}
+    for name in names:
+        config_path = os.path.join(accounts_dir, name, "config.txt")
+        own = load_config(config_path) if os.path.exists(config_path) else {}
+        configs[name] = ({**base_config, **own}, own)
+    return configs
+
+
+def rate_budgets(configs, workers):
+    """SPOTIBOT_RATE_LIMIT de cada cuenta: el suyo si lo fija o, si no, el de su aplicación repartido.
+
+    El de la aplicación se divide entre las cuentas con el mismo SPOTIPY_CLIENT_ID que pueden ir a la vez.
+    """
+    shared = Counter(config.get("SPOTIPY_CLIENT_ID") for config, _ in configs.values())
+    budgets = {}
+    for name, (config, own) in configs.items():
+        rate = float(config.get("SPOTIBOT_RATE_LIMIT", RATE_LIMIT))
+        if "SPOTIBOT_RATE_LIMIT" not in own and rate > 0:
+            rate /= min(workers, shared[config.get("SPOTIPY_CLIENT_ID")])
+        budgets[name] = rate
+    return budgets
+
+
+# === Sincronización de una cuenta (en un proceso del pool) ===
+def sync_account(name, account_dir, config, dias):
+    """Sincroniza una cuenta trabajando dentro de su carpeta. Devuelve un resumen del informe de la ejecución."""
+    os.chdir(account_dir)
+    if not os.path.exists(TOKEN_CACHE):
+        raise RuntimeError(f"La cuenta no tiene token: ejecuta 'python spotibot_accounts.py --authorize {name}'.")
+    with open(LOG_FILE, "w") as log, contextlib.redirect_stdout(log):
+        metrics = RunMetrics()
+        with metrics.stage("auth"):
+            manager = SpotifyClientManager(config, cache_path=os.path.abspath(TOKEN_CACHE))
+            sp = manager.get_client()
+            metrics.track_api(sp.scheduler)
+            user_id = manager.current_user()["id"]
+        report = run_sync(sp, user_id, config, load_playlists(os.path.abspath("playlists.txt")), dias, metrics)
+        print(f"\nProceso finalizado. {sp.scheduler.summary()}")
+    return {
+        "status": report["status"],
+        "added": sum(entry.get("added", 0) for entry in report["genres"].values()),
+        "seconds": report["duration_seconds"],
+        "calls": report.get("api", {}).get("total_calls", 0),
+    }
+
+
+def authorize_account(name, account_dir, config):
+    """Pide el código de autorización por consola y guarda el token de la cuenta."""
+    os.chdir(account_dir)
+    manager = SpotifyClientManager(config, cache_path=os.path.abspath(TOKEN_CACHE))
+    user = manager.current_user()
+    print(f"Cuenta '{name}' autorizada como {user.get('display_name') or user['id']}.")
+
+
+# === Ejecución de todas las cuentas ===
+def run_accounts(accounts_dir, names, configs, dias, workers):
+    """Reparte las cuentas entre 'workers' procesos. Devuelve {cuenta: resumen o excepción}."""
+    results = {}
+    with ProcessPoolExecutor(max_workers=max(1, min(workers, len(names)))) as executor:
+        futures = {executor.submit(sync_account, name, os.path.join(accounts_dir, name), configs[name], dias): name
+                   for name in names}
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                result = results[name] = future.result()
+                print(f"{name}: {result['status']}, {result['added']} canciones añadidas en {result['seconds']:.0f}s "
+                      f"({result['calls']} llamadas a la API).")
+            except Exception as e:
+                results[name] = e
+                print(f"{name}: error: {e}")
+    return results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Sincroniza varias cuentas de Spotify en paralelo.")
+    parser.add_argument("accounts", nargs="*", help="Cuentas a sincronizar (por defecto, todas)")
+    parser.add_argument("--dias", type=int, default=7, help="Días de novedades a añadir (7 por defecto)")
+    parser.add_argument("--workers", type=int, help="Cuentas sincronizadas a la vez (SPOTIBOT_ACCOUNT_WORKERS)")
+    parser.add_argument("--authorize", metavar="CUENTA", help="Autoriza una cuenta y guarda su token")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    base_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.txt")
+    base_config = load_config(base_path) if os.path.exists(base_path) else {}
+    accounts_dir = os.path.abspath(base_config.get("SPOTIBOT_ACCOUNTS_DIR", ACCOUNTS_DIR))
+
+    if args.authorize:
+        config, _ = load_account_configs(base_config, accounts_dir, [args.authorize])[args.authorize]
+        authorize_account(args.authorize, os.path.join(accounts_dir, args.authorize), config)
+        return 0
+
+    available = list_accounts(accounts_dir)
+    unknown = [name for name in args.accounts if name not in available]
+    if unknown:
+        print(f"Cuentas desconocidas: {', '.join(unknown)} (disponibles: {', '.join(available) or 'ninguna'}).")
+        return 1
+    names = args.accounts or available
+    if not names:
+        print(f"No hay cuentas en '{accounts_dir}'.")
+        return 1
+
+    workers = args.workers or int(base_config.get("SPOTIBOT_ACCOUNT_WORKERS", ACCOUNT_WORKERS))
+    configs = load_account_configs(base_config, accounts_dir, names)
+    budgets = rate_budgets(configs, min(workers, len(names)))
+    merged = {name: {**config, "SPOTIBOT_RATE_LIMIT": str(budgets[name])} for name, (config, _) in configs.items()}
+
+    print(f"Sincronizando {len(names)} cuentas ({min(workers, len(names))} a la vez), últimos {args.dias} días.")
+    results = run_accounts(accounts_dir, names, merged, args.dias, workers)
+    failed = [name for name, result in results.items() if isinstance(result, Exception) or result["status"] == "error"]
+    print(f"\nProceso finalizado: {len(names) - len(failed)} cuentas correctas, {len(failed)} con errores.")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
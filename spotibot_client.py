@@ -0,0 +1,103 @@
+############# EXPLICACION ##############
+# Cliente de Spotify de larga duración.
+# Se crea una sola vez por proceso: el token se renueva solo a través del SpotifyOAuth, todas las
+# peticiones reutilizan una misma sesión HTTP keep-alive y el perfil del usuario se pide una única vez.
+import threading
+
+import requests
+import spotipy
+from requests.adapters import HTTPAdapter
+from spotipy.cache_handler import CacheFileHandler
+from spotipy.oauth2 import SpotifyOAuth
+
+from spotibot_fetch import MAX_WORKERS
+from spotibot_http_cache import CachingAdapter, ResponseCache
+from spotibot_scheduler import RequestScheduler, ScheduledSpotify
+
+SCOPE = "playlist-read-private playlist-modify-private ugc-image-upload"
+TOKEN_CACHE = "token_cache.json"
+
+
+# === Caché del token en memoria respaldada por token_cache.json ===
+class CachedTokenFile(CacheFileHandler):
+    """spotipy relee el fichero del token en cada petición; aquí se lee una vez y se guarda al renovarlo."""
+
+    def __init__(self, cache_path=TOKEN_CACHE):
+        super().__init__(cache_path=cache_path)
+        self.token_info = None
+        self.lock = threading.Lock()
+
+    def get_cached_token(self):
+        with self.lock:
+            if self.token_info is None:
+                self.token_info = super().get_cached_token()
+            return self.token_info
+
+    def save_token_to_cache(self, token_info):
+        with self.lock:
+            self.token_info = token_info
+            super().save_token_to_cache(token_info)
+
+
+# === Gestor del cliente ===
+class SpotifyClientManager:
+    """Construye el cliente una vez y lo reutiliza durante toda la vida del proceso."""
+
+    def __init__(self, config, cache_path=TOKEN_CACHE):
+        self.config = config
+        self.cache_path = cache_path
+        self.pool_size = int(config.get("SPOTIBOT_MAX_WORKERS", MAX_WORKERS))
+        self.http_cache = ResponseCache.from_config(config)
+        self.client = None
+        self.user = None
+        self.lock = threading.Lock()
+
+    def _authorize(self, oauth):
+        """Pide el código de autorización por consola si aún no hay token guardado."""
+        if oauth.validate_token(oauth.cache_handler.get_cached_token()):
+            return
+        print("No se encontró token de acceso almacenado.")
+        print("Por favor, ingresa el código de autorización manualmente.")
+
+        auth_url = oauth.get_authorize_url()
+        print(f"Abre el siguiente enlace en tu navegador y otorga los permisos: {auth_url}")
+
+        redirect_response = input("Pega la URL completa después de autorizar aquí: ")
+        code = oauth.parse_response_code(redirect_response)
+        oauth.get_access_token(code, as_dict=False)
+
+    def _build_session(self):
+        # Sesión keep-alive con tantas conexiones como peticiones simultáneas hace el motor de descarga.
+        # Sin reintentos de urllib3: los 429 y 5xx los gestiona el planificador.
+        # Con la caché HTTP activa los GET se hacen condicionales (ver spotibot_http_cache).
+        session = requests.Session()
+        pool = {"pool_connections": 2, "pool_maxsize": max(self.pool_size, 10)}
+        adapter = CachingAdapter(self.http_cache, **pool) if self.http_cache else HTTPAdapter(**pool)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    def get_client(self):
+        with self.lock:
+            if self.client is None:
+                oauth = SpotifyOAuth(
+                    client_id=self.config["SPOTIPY_CLIENT_ID"],
+                    client_secret=self.config["SPOTIPY_CLIENT_SECRET"],
+                    redirect_uri=self.config["SPOTIPY_REDIRECT_URI"],
+                    scope=SCOPE,
+                    cache_handler=CachedTokenFile(self.cache_path),
+                )
+                self._authorize(oauth)
+                sp = spotipy.Spotify(auth_manager=oauth, requests_session=self._build_session())
+                self.client = ScheduledSpotify(sp, RequestScheduler.from_config(self.config))
+                self.client.scheduler.http_cache = self.http_cache
+                print("Autenticación exitosa.")
+            return self.client
+
+    def current_user(self):
+        """Perfil del usuario (se pide a Spotify una sola vez por proceso)."""
+        client = self.get_client()
+        with self.lock:
+            if self.user is None:
+                self.user = client.current_user()
+            return self.user
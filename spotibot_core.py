@@ -1,34 +1,30 @@
+import argparse
 import os
-import datetime
-from datetime import timedelta
-import spotipy
-from spotipy.oauth2 import SpotifyOAuth
-import base64
-from spotipy.exceptions import SpotifyException
+from spotibot_daemon import SyncDaemon
+from spotibot_dedup import track_key
+from spotibot_fetch import PlaylistFetcher
+from spotibot_filters import is_recent
+from spotibot_manifest import Manifest, parse_config, parse_playlists
+from spotibot_metrics import RunMetrics
+from spotibot_pipeline import GENRE_WORKERS, SyncContext, run_genres
+from spotibot_plan import (PLAN_FILE, UNLISTED_REASONS, estimate_writes, load_plan, new_plan, plan_track,
+                           plan_track_item, save_plan, summarize)
+from spotibot_rotation import RotationPolicy
+from spotibot_scheduler import api_errors
+from spotibot_state import CoverStore, PlaylistIndex, cutoff_timestamp
+from spotibot_store import GLOBAL_SCOPE, genre_scope
 
 # === Función para cargar playlists desde un archivo ===
 def load_playlists(file_path="playlists.txt"):
-    """Carga las playlists desde un archivo y extrae sus URLs y géneros."""
+    """Carga las playlists desde un archivo y las agrupa por género (manifiesto cacheado en data/manifest.json)."""
     file_path = os.path.join(os.path.dirname(__file__), file_path)  # Ruta basada en el script
     if not os.path.exists(file_path):
         raise FileNotFoundError(f"El archivo '{file_path}' no existe.")
-    
+
     playlists_by_genre = {}  # Diccionario para agrupar playlists por género
-    
-    with open(file_path, "r") as f:
-        for line in f:
-            parts = line.strip().split(" ")
-            if len(parts) < 2:  # Ignorar líneas mal formateadas
-                continue
-            url, genre = parts[0], parts[1]
-            if "playlist/" in url:
-                playlist_id = url.split("playlist/")[1].split("?")[0]  # Extraer ID sin parámetros
-                playlist_data = {"id": f"spotify:playlist:{playlist_id}", "url": url}
-                
-                if genre not in playlists_by_genre:
-                    playlists_by_genre[genre] = []
-                playlists_by_genre[genre].append(playlist_data)
-    
+    for playlist in Manifest().load(file_path, parse_playlists):
+        playlist_data = {key: value for key, value in playlist.items() if key != "genre"}
+        playlists_by_genre.setdefault(playlist["genre"], []).append(playlist_data)
     return playlists_by_genre
 
 # === Función para normalizar nombres de género ===
@@ -46,10 +42,15 @@ def get_all_user_playlists(sp):
     return playlists
 
 # === Función para establecer la imagen de la playlist ===
-def set_playlist_image(sp, playlist_id, genre):
+def genre_image_paths(genre):
+    """(imagen del género, imagen predeterminada) dentro de la carpeta images."""
     genre_image_name = f"{genre.lower().replace(' ', '_')}.jpg"
-    genre_image_path = os.path.join("images", genre_image_name)  # Carpeta "images" para almacenar imágenes
-    default_image_path = os.path.join("images", "spotibot.jpg")  # Imagen predeterminada
+    # Carpeta "images" para almacenar imágenes; si la carpeta de trabajo (p. ej. la de una cuenta) no tiene, la del script
+    images_dir = "images" if os.path.isdir("images") else os.path.join(os.path.dirname(os.path.abspath(__file__)), "images")
+    return os.path.join(images_dir, genre_image_name), os.path.join(images_dir, "spotibot.jpg")
+
+def set_playlist_image(sp, playlist_id, genre, covers=None):
+    genre_image_path, default_image_path = genre_image_paths(genre)
 
     if not os.path.exists(genre_image_path):
         print(f"No se encontró imagen '{genre_image_path}' para el género '{genre}', buscando imagen predeterminada.")
@@ -60,16 +61,22 @@ def set_playlist_image(sp, playlist_id, genre):
             print(f"Usando imagen predeterminada '{default_image_path}'.")
             genre_image_path = default_image_path
 
+    # Solo se sube la imagen si la playlist es nueva o la imagen ha cambiado desde la última subida
+    if covers is None:
+        covers = CoverStore()
     try:
-        with open(genre_image_path, "rb") as image_file:
-            encoded_image = base64.b64encode(image_file.read())
-            sp.playlist_upload_cover_image(playlist_id, encoded_image)
-            print(f"Imagen establecida para la playlist del género '{genre}' con éxito.")
+        image_hash, encoded_image = covers.load_image(genre_image_path)
+        if covers.is_current(playlist_id, image_hash):
+            print(f"La imagen de la playlist del género '{genre}' ya está actualizada.")
+            return
+        sp.playlist_upload_cover_image(playlist_id, encoded_image)
+        covers.record(playlist_id, image_hash)
+        print(f"Imagen establecida para la playlist del género '{genre}' con éxito.")
     except FileNotFoundError:
         print(f"Error: La imagen '{genre_image_path}' no fue encontrada.")
     except IOError as e:
         print(f"Error al abrir la imagen '{genre_image_path}': {e}")
-    except SpotifyException as e:
+    except api_errors() as e:
         print(f"Error al subir la imagen para la playlist {playlist_id}: {e}")
     except Exception as e:
         print(f"Ocurrió un error inesperado: {e}")
@@ -77,138 +84,84 @@ def set_playlist_image(sp, playlist_id, genre):
 # === Leer la configuración desde el fichero config.txt ===
 def load_config(file_path="config.txt"):
     file_path = os.path.join(os.path.dirname(__file__), file_path)
-    config = {}
-    with open(file_path, "r") as f:
-        for line in f:
-            key, value = line.strip().split("=", 1)
-            config[key] = value
-    return config
+    return dict(Manifest().load(file_path, parse_config))
 
 # === Funciones de Autenticación ===
 def authenticate_spotify():
-    config = load_config()
-    scope = "playlist-read-private playlist-modify-private ugc-image-upload"
-    
-    sp_oauth = SpotifyOAuth(
-        client_id=config["SPOTIPY_CLIENT_ID"],
-        client_secret=config["SPOTIPY_CLIENT_SECRET"],
-        redirect_uri=config["SPOTIPY_REDIRECT_URI"],
-        scope=scope,
-        cache_path="token_cache.json"
-    )
-
-    token_info = sp_oauth.get_cached_token()
-    if not token_info:
-        print("No se encontró token de acceso almacenado.")
-        print("Por favor, ingresa el código de autorización manualmente.")
-
-        auth_url = sp_oauth.get_authorize_url()
-        print(f"Abre el siguiente enlace en tu navegador y otorga los permisos: {auth_url}")
-
-        redirect_response = input("Pega la URL completa después de autorizar aquí: ")
-        code = sp_oauth.parse_response_code(redirect_response)
-        token_info = sp_oauth.get_access_token(code)
-
-    sp = spotipy.Spotify(auth=token_info['access_token'])
-    print("Autenticación exitosa.")
-    return sp
+    """Devuelve un cliente que renueva el token solo y reutiliza una sesión HTTP con pool de conexiones."""
+    from spotibot_client import SpotifyClientManager  # spotipy se importa al autenticar, no al arrancar
+
+    return SpotifyClientManager(load_config()).get_client()
 
 # === Funciones de Manejo de Canciones ===
-def get_playlist_tracks(sp, playlist_id):
-    tracks = []
-    try:
-        results = sp.playlist_items(playlist_id, market='from_token')
-        if not results['items']:
-            print(f"La playlist {playlist_id} no tiene canciones o no se pudo acceder.")
-        while results:
-            tracks.extend(results['items'])
-            results = sp.next(results) if results['next'] else None
-    except spotipy.exceptions.SpotifyException as e:
-        if e.http_status == 404:
-            print(f"Playlist {playlist_id} no encontrada o no accesible (error 404).")
-        else:
-            print(f"Error al obtener canciones de la playlist {playlist_id}: {e}")
-    return tracks
+def get_playlist_tracks(sp, playlist_id, fetcher=None):
+    """Descarga todos los items de una playlist pidiendo sus páginas en paralelo."""
+    if fetcher is None:
+        fetcher = PlaylistFetcher(sp)
+    return fetcher.fetch_playlist(playlist_id)
 
+# Los filtros son generadores sobre TrackItem: se encadenan sin crear listas intermedias
 def filter_new_tracks(old_tracks, current_tracks):
-    old_ids = set(old_tracks)
-    new_tracks = [track for track in current_tracks if track['track'] and track['track']['id'] not in old_ids]
-    return new_tracks
+    old_ids = old_tracks if isinstance(old_tracks, (set, frozenset)) else set(old_tracks)
+    return (track for track in current_tracks if track.id and track.id not in old_ids)
 
 def filter_recent_tracks(new_tracks, days):
-    recent_tracks = []
-    now = datetime.datetime.now(datetime.timezone.utc)
-    cutoff_date = now - timedelta(days=days)
+    # Las fechas ISO-8601 se comparan como texto con la fecha de corte, sin parsear cada una
+    cutoff = cutoff_timestamp(days)
+    found = 0
 
     for track in new_tracks:
-        if 'added_at' not in track:
-            print(f"Advertencia: El track {track['track']['name']} no tiene fecha de adición.")
-            continue
-        try:
-            added_at = datetime.datetime.strptime(track['added_at'], '%Y-%m-%dT%H:%M:%SZ')
-            added_at = added_at.replace(tzinfo=datetime.timezone.utc)
-        except ValueError as e:
-            print(f"Error al parsear fecha {track['added_at']}: {e}")
-            continue
-        if added_at >= cutoff_date:
-            recent_tracks.append(track)
+        if is_recent(track, cutoff):
+            found += 1
+            yield track
 
-    print(f"{len(recent_tracks)} canciones recientes encontradas (últimos {days} días).")
-    return recent_tracks
+    print(f"{found} canciones recientes encontradas (últimos {days} días).")
 
 def filter_duplicate_tracks(new_tracks, global_track_ids):
-    return [track for track in new_tracks if track['track'] and track['track']['id'] not in global_track_ids]
-
-def get_weekly_playlist_tracks(sp, playlist_id):
-    tracks = get_playlist_tracks(sp, playlist_id)
-    return {track['track']['id'] for track in tracks if track['track']}
-
-# === Funciones de Persistencia ===
-def load_old_tracks(file_path):
-    if os.path.exists(file_path):
-        with open(file_path, "r") as f:
-            return [line.strip() for line in f]
-    return []
-
-def save_new_tracks(file_path, tracks):
-    dir_path = os.path.dirname(file_path)
-    if dir_path:
-        os.makedirs(dir_path, exist_ok=True)
-    with open(file_path, "a") as f:
-        for track in tracks:
-            f.write(f"{track['track']['id']}\n")
-
-def load_global_tracks(file_path="global_tracks.txt"):
-    if os.path.exists(file_path):
-        with open(file_path, "r") as f:
-            return set(line.strip() for line in f)
-    return set()
-
-def save_global_tracks(tracks, file_path="global_tracks.txt"):
-    with open(file_path, "a") as f:
-        for track_id in tracks:
-            f.write(f"{track_id}\n")
+    return (track for track in new_tracks if track.id and track.id not in global_track_ids)
 
-# === Funciones de Gestión de Listas ===
-def get_or_create_genre_playlist(sp, user_id, genre):
-    today = datetime.date.today()
-    year = today.year
+def get_weekly_playlist_tracks(sp, playlist_id, fetcher=None):
+    tracks = get_playlist_tracks(sp, playlist_id, fetcher)
+    return {track.id for track in tracks if track.id}
 
-    playlist_name = f"{normalize_genre_name(genre)} {year}"
+# === Funciones de Gestión de Listas ===
+def get_or_create_genre_playlist(sp, user_id, genre, index=None, rotation=None, playlist_name=None):
+    # El nombre depende de la rotación configurada (por defecto "GÉNERO AAAA", una playlist por año)
+    if rotation is None:
+        rotation = RotationPolicy()
+    if playlist_name is None:
+        playlist_name = rotation.playlist_name(normalize_genre_name(genre), genre)
     print(f"Buscando o creando playlist con nombre: '{playlist_name}'")
 
-    user_playlists = get_all_user_playlists(sp)
-    for playlist in user_playlists:
-        if playlist and 'name' in playlist and playlist['name'] == playlist_name:
-            print(f"Playlist existente encontrada: '{playlist_name}' (ID: {playlist['id']})")
-            return playlist['id'], playlist_name
+    # El índice de la biblioteca se lista una vez y se reutiliza para todos los géneros
+    if index is None:
+        index = PlaylistIndex()
+    playlist_id = index.lookup(sp, user_id, playlist_name)
+    if playlist_id:
+        print(f"Playlist existente encontrada: '{playlist_name}' (ID: {playlist_id})")
+        return playlist_id, playlist_name
 
     print(f"No se encontró playlist '{playlist_name}'. Creando una nueva...")
     new_playlist = sp.user_playlist_create(user_id, playlist_name, public=False)
     description = f"Lista generada con SpotiBOT para {normalize_genre_name(genre)}"
     sp.playlist_change_details(new_playlist['id'], description=description)
+    index.add(playlist_name, new_playlist['id'])
     return new_playlist['id'], playlist_name
 
+def get_target_playlist(ctx, genre):
+    """Playlist de destino del género según la rotación, con su contenido: (id, nombre, ids, claves)."""
+    with ctx.metrics.stage("library"):
+        playlist_id, playlist_name = get_or_create_genre_playlist(ctx.sp, ctx.user_id, genre, ctx.index, ctx.rotation)
+    # Contenido de la playlist de destino (cacheado por snapshot_id, con nuestras altas ya aplicadas)
+    track_ids, keys = ctx.target_members(playlist_id)
+    if ctx.rotation.is_full(len(track_ids)):
+        print(f"La playlist '{playlist_name}' tiene {len(track_ids)} canciones, se pasa a la siguiente.")
+        ctx.rotation.advance(genre)
+        return get_target_playlist(ctx, genre)
+    if ctx.expire_target(genre, playlist_id):
+        track_ids, keys = ctx.target_members(playlist_id)
+    return playlist_id, playlist_name, track_ids, keys
+
 # === Funcion seleccion rango de antiguedad para la actualizacion de listas ===
 def seleccionar_rango_tiempo():
     opcion = input("Se agregarán las novedades de los últimos 7 días (Introduce un número para modificar la cantidad de días): ").strip()
@@ -225,45 +178,260 @@ def seleccionar_rango_tiempo():
             print("Entrada inválida, se usarán 7 días por defecto.")
             return 7
 
+# === Procesado de un género ===
+def process_genre(ctx, genre, playlists):
+    """Añade a la playlist del género las novedades de sus playlists de origen. Devuelve cuántas se añadieron."""
+    print(f"\nProcesando género: {genre}")
+    sp, writer = ctx.sp, ctx.writer
+
+    weekly_playlist_id, weekly_playlist_name, weekly_track_ids, weekly_keys = get_target_playlist(ctx, genre)
+    tracks_by_playlist = ctx.fetch_sources(genre, playlists)
+    added = 0
+
+    # Nuevas, recientes, sin duplicar y reservadas frente a los demás géneros (la misma regla que --plan)
+    with ctx.metrics.stage("filter") as stage:
+        sources = [(playlist['id'], tracks_by_playlist[playlist['id']]) for playlist in playlists]
+        selected, _ = ctx.select_new_tracks(genre, sources, weekly_track_ids, weekly_keys)
+        stage.items = sum(len(tracks) for _, tracks in sources)
+
+    for playlist in playlists:
+        print(f"Procesando playlist: {playlist['url']}")
+        unique_tracks = selected[playlist['id']]
+        print(f"{len(unique_tracks)} canciones nuevas encontradas (últimos {ctx.dias} días).")
+        if unique_tracks:
+            print(f"Agregando {len(unique_tracks)} canciones únicas a la lista semanal '{weekly_playlist_name}'...")
+            tracks = [(track.id, track.uri, track_key(track)) for track in unique_tracks]
+            try:
+                # Se añaden en bloques de 100 y el historial de cada bloque se guarda al confirmarse
+                with ctx.metrics.stage("add") as stage:
+                    stage.items = writer.add_tracks(weekly_playlist_id, tracks, [genre_scope(genre), GLOBAL_SCOPE])
+                added += stage.items
+            except api_errors() as e:
+                print(f"Error al agregar canciones a la playlist: {e}")
+                ctx.release_tracks(unique_tracks)
+                ctx.failed.add((genre, playlist['id']))
+                continue
+        else:
+            print("No se encontraron canciones nuevas para agregar.")
+
+        ctx.mark_processed(genre, playlist['id'])
+
+    with ctx.metrics.stage("cover"):
+        set_playlist_image(sp, weekly_playlist_id, genre, ctx.covers)
+    return added
+
+# === Plan en seco y aplicación de un plan (ver spotibot_plan.py) ===
+def find_target_playlist(ctx, genre):
+    """Como get_target_playlist pero sin crear ni quitar nada: (id o None, nombre, ids, claves, ids caducados)."""
+    base_name = normalize_genre_name(genre)
+    playlist_name = ctx.rotation.playlist_name(base_name, genre)
+    with ctx.metrics.stage("library"):
+        playlist_id = ctx.index.lookup(ctx.sp, ctx.user_id, playlist_name)
+    if playlist_id is None:
+        return None, playlist_name, set(), set(), []
+    track_ids, keys = ctx.target_members(playlist_id)
+    if ctx.rotation.is_full(len(track_ids)):
+        playlist_name = ctx.rotation.playlist_name(base_name, genre, ctx.rotation.part(genre) + 1)
+        with ctx.metrics.stage("library"):
+            playlist_id = ctx.index.lookup(ctx.sp, ctx.user_id, playlist_name)
+        if playlist_id is None:
+            return None, playlist_name, set(), set(), []
+        track_ids, keys = ctx.target_members(playlist_id)
+    return playlist_id, playlist_name, track_ids, keys, ctx.expired_tracks(genre, playlist_id)
+
+def cover_is_current(ctx, playlist_id, genre):
+    """True si set_playlist_image no subiría nada: la playlist ya tiene la imagen actual o no hay imagen."""
+    if playlist_id is None:
+        return False
+    genre_image_path, default_image_path = genre_image_paths(genre)
+    image_path = genre_image_path if os.path.exists(genre_image_path) else default_image_path
+    try:
+        image_hash, _ = ctx.covers.load_image(image_path)
+    except OSError:
+        return True
+    return ctx.covers.is_current(playlist_id, image_hash)
+
+def plan_genre(ctx, genre, playlists):
+    """Calcula lo que process_genre haría con el género, sin escribir nada. Devuelve la entrada del plan."""
+    print(f"\nPlanificando género: {genre}")
+    playlist_id, playlist_name, target_ids, target_keys, expired = find_target_playlist(ctx, genre)
+    tracks_by_playlist = ctx.fetch_sources(genre, playlists)
+    entry = {"playlist_name": playlist_name, "playlist_id": playlist_id, "scopes": [genre_scope(genre), GLOBAL_SCOPE],
+             "cover_current": cover_is_current(ctx, playlist_id, genre), "sources": [], "add": [],
+             "remove": expired, "skipped": {}, "duplicates": []}
+
+    with ctx.metrics.stage("filter") as stage:
+        # Misma selección y reservas que una ejecución real (solo en memoria: nunca se confirman en el historial)
+        sources = [(playlist['id'], tracks_by_playlist[playlist['id']]) for playlist in playlists]
+        selected, skipped = ctx.select_new_tracks(genre, sources, target_ids, target_keys)
+        for playlist in playlists:
+            current_tracks = tracks_by_playlist[playlist['id']]
+            entry["add"] += [plan_track(track, playlist['id']) for track in selected[playlist['id']]]
+            for track, reason in skipped[playlist['id']]:
+                entry["skipped"][reason] = entry["skipped"].get(reason, 0) + 1
+                if reason not in UNLISTED_REASONS:
+                    entry["duplicates"].append(plan_track(track, playlist['id'], reason))
+            source = {"id": playlist['id'], "snapshot_id": ctx.snapshot_ids.get(playlist['id']),
+                      "fetched": len(current_tracks)}
+            if playlist['id'] in ctx.fetcher.errors:
+                source["error"] = True
+            entry["sources"].append(source)
+            stage.items += len(current_tracks)
+
+    entry["estimated_writes"] = estimate_writes(entry)
+    print(f"{len(entry['add'])} canciones a añadir a '{playlist_name}', {len(expired)} a quitar.")
+    return entry
+
+def apply_genre(ctx, genre, entry):
+    """Hace las escrituras de la entrada del plan de un género. Devuelve cuántas canciones se añadieron."""
+    print(f"\nAplicando el plan del género: {genre}")
+    writer = ctx.writer
+    playlist_id = entry["playlist_id"]
+    if playlist_id is None:
+        with ctx.metrics.stage("library"):
+            playlist_id, _ = get_or_create_genre_playlist(ctx.sp, ctx.user_id, genre, ctx.index,
+                                                          playlist_name=entry["playlist_name"])
+    if entry["remove"]:
+        with ctx.metrics.stage("rotate") as stage:
+            stage.items = writer.remove_tracks(playlist_id, entry["remove"])
+        print(f"Quitadas {stage.items} canciones caducadas de '{entry['playlist_name']}'.")
+
+    # Otra ejecución pudo añadir algunas entre el plan y su aplicación: se vuelven a elegir con la misma regla
+    with ctx.metrics.stage("filter") as stage:
+        target_ids, target_keys = ctx.target_members(playlist_id) if entry["playlist_id"] else (set(), set())
+        sources = {}
+        for track in entry["add"]:
+            sources.setdefault(track["source"], []).append(plan_track_item(track))
+        selected, _ = ctx.select_new_tracks(genre, list(sources.items()), target_ids, target_keys)
+        tracks = [track for playlist_tracks in selected.values() for track in playlist_tracks]
+        stage.items = len(entry["add"])
+    if len(tracks) < len(entry["add"]):
+        print(f"{len(entry['add']) - len(tracks)} canciones del plan ya se añadieron en otra ejecución, se omiten.")
+
+    added = 0
+    if tracks:
+        try:
+            with ctx.metrics.stage("add") as stage:
+                rows = [(track.id, track.uri, track_key(track)) for track in tracks]
+                stage.items = writer.add_tracks(playlist_id, rows, entry["scopes"])
+            added = stage.items
+        except Exception:
+            ctx.release_tracks(tracks)
+            raise
+
+    # Las playlists de origen quedan procesadas con el snapshot que se vio al hacer el plan
+    for source in entry["sources"]:
+        if not source.get("error"):
+            ctx.snapshot_ids[source["id"]] = source["snapshot_id"]
+            ctx.mark_processed(genre, source["id"])
+    with ctx.metrics.stage("cover"):
+        set_playlist_image(ctx.sp, playlist_id, genre, ctx.covers)
+    print(f"{added} canciones añadidas a '{entry['playlist_name']}'.")
+    return added
+
+def run_plan(sp, user_id, config, playlists_by_genre, dias, metrics=None):
+    """Calcula el plan de todos los géneros sin escribir en Spotify ni en el historial."""
+    ctx = SyncContext(sp, user_id, config, dias, metrics)
+    plan = new_plan(user_id, dias, ctx.cutoff)
+    workers = int(config.get("SPOTIBOT_GENRE_WORKERS", GENRE_WORKERS))
+    try:
+        results = run_genres(ctx, playlists_by_genre, plan_genre, workers)
+    finally:
+        ctx.close()  # Solo guarda cachés: no hay altas ni snapshots nuevos que registrar
+    plan["genres"] = {genre: result for genre, result in results.items() if not isinstance(result, Exception)}
+    plan["errors"] = {genre: str(result) for genre, result in results.items() if isinstance(result, Exception)}
+    plan["fetch_errors"] = sorted(ctx.fetcher.errors)
+    plan["totals"] = summarize(plan)
+    api = ctx.metrics.api_stats()
+    if api is not None:
+        plan["planning_calls"] = api["total_calls"]
+    return plan
+
+def run_apply(sp, user_id, config, plan, metrics=None):
+    """Aplica un plan guardado con run_plan() y devuelve el informe de la ejecución."""
+    if plan["user_id"] != user_id:
+        raise ValueError(f"El plan es de otra cuenta ({plan['user_id']}).")
+    ctx = SyncContext(sp, user_id, config, plan["days"], metrics)
+    ctx.cutoff = plan["cutoff"]  # Los snapshots se registran con el corte con el que se filtró
+    try:
+        ctx.writer.resume()
+        run_genres(ctx, plan["genres"], apply_genre, int(config.get("SPOTIBOT_GENRE_WORKERS", GENRE_WORKERS)))
+    finally:
+        ctx.close()
+        report = ctx.write_report()
+    return report
+
+# === Sincronización completa de una cuenta ===
+def run_sync(sp, user_id, config, playlists_by_genre, dias, metrics=None):
+    """Procesa todos los géneros una vez y devuelve el informe de la ejecución."""
+    # Los géneros se procesan a la vez: mientras uno escribe, otro puede estar descargando
+    ctx = SyncContext(sp, user_id, config, dias, metrics)
+    try:
+        ctx.start()
+        run_genres(ctx, playlists_by_genre, process_genre, int(config.get("SPOTIBOT_GENRE_WORKERS", GENRE_WORKERS)))
+    finally:
+        ctx.close()
+        report = ctx.write_report()
+    return report
+
+# === Argumentos de línea de comandos ===
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Añade a la playlist de cada género las novedades de sus playlists de origen.")
+    parser.add_argument("--dias", type=int, help="Días de novedades a añadir (sin preguntar; para cron usa --dias 7)")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--daemon", action="store_true",
+                      help="Queda en marcha y sincroniza cada playlist según su intervalo (SPOTIBOT_INTERVAL)")
+    mode.add_argument("--plan", nargs="?", const=PLAN_FILE, metavar="FICHERO",
+                      help=f"Calcula qué se añadiría sin modificar nada y lo guarda en JSON (por defecto {PLAN_FILE})")
+    mode.add_argument("--apply", nargs="?", const=PLAN_FILE, metavar="FICHERO",
+                      help="Aplica un plan guardado con --plan: solo hace las escrituras")
+    args = parser.parse_args(argv)
+    if args.dias is not None and args.dias <= 0:
+        parser.error("--dias debe ser un número positivo")
+    return args
+
 # === Función principal ===
-def main():
-    sp = authenticate_spotify()
-    user = sp.current_user()
+def main(argv=None):
+    args = parse_args(argv)
+    metrics = RunMetrics()
+    with metrics.stage("auth"):
+        sp = authenticate_spotify()
+        metrics.track_api(sp.scheduler)
+        user = sp.current_user()
     user_id = user['id']
 
-    playlists_by_genre = load_playlists()
-    dias = seleccionar_rango_tiempo()
-
-    for genre, playlists in playlists_by_genre.items():
-        print(f"\nProcesando género: {genre}")
-
-        weekly_playlist_id, weekly_playlist_name = get_or_create_genre_playlist(sp, user_id, genre)
-        weekly_track_ids = get_weekly_playlist_tracks(sp, weekly_playlist_id)
-        global_tracks = load_global_tracks()
+    if args.apply:
+        plan = load_plan(args.apply)
+        totals = plan["totals"]
+        print(f"Aplicando el plan del {plan['created_at']}: {totals['add']} canciones a añadir, "
+              f"{totals['remove']} a quitar (~{totals['estimated_calls']} escrituras).")
+        run_apply(sp, user_id, load_config(), plan, metrics)
+        print(f"\nProceso finalizado. {sp.scheduler.summary()}")
+        return
+
+    if args.dias is not None:
+        dias = args.dias
+        print(f"Actualizando novedades de los últimos {dias} días automáticamente.")
+    elif args.daemon:
+        dias = 7  # Solo para la primera sincronización de cada playlist; luego cuenta desde la última correcta
+    else:
+        dias = seleccionar_rango_tiempo()
 
-        for playlist in playlists:
-            print(f"Procesando playlist: {playlist['url']}")
-            current_tracks = get_playlist_tracks(sp, playlist['id'])
-            old_tracks = load_old_tracks(f"data/{genre}_old_tracks.txt")
-            new_tracks = filter_new_tracks(old_tracks, current_tracks)
-            recent_tracks = filter_recent_tracks(new_tracks, dias)
-            unique_tracks = filter_duplicate_tracks(recent_tracks, weekly_track_ids.union(global_tracks))
-
-            if unique_tracks:
-                print(f"Agregando {len(unique_tracks)} canciones únicas a la lista semanal '{weekly_playlist_name}'...")
-                track_uris = [track['track']['uri'] for track in unique_tracks if track['track']]
-                try:
-                    sp.playlist_add_items(weekly_playlist_id, track_uris)
-                    save_new_tracks(f"data/{genre}_old_tracks.txt", unique_tracks)
-                    save_global_tracks([track['track']['id'] for track in unique_tracks])
-                except SpotifyException as e:
-                    print(f"Error al agregar canciones a la playlist: {e}")
-            else:
-                print("No se encontraron canciones nuevas para agregar.")
-
-        set_playlist_image(sp, weekly_playlist_id, genre)
-
-    print("\nProceso finalizado.")
+    config = load_config()
+    if args.daemon:
+        SyncDaemon(sp, user_id, config, load_playlists, dias, process_genre).run()
+        return
+
+    if args.plan:
+        plan = run_plan(sp, user_id, config, load_playlists(), dias, metrics)
+        save_plan(plan, args.plan)
+        totals = plan["totals"]
+        print(f"\nPlan guardado en '{args.plan}': {totals['add']} canciones a añadir, {totals['remove']} a quitar, "
+              f"~{totals['estimated_calls']} escrituras. No se ha modificado nada.")
+        return
+
+    run_sync(sp, user_id, config, load_playlists(), dias, metrics)
+    print(f"\nProceso finalizado. {sp.scheduler.summary()}")
 
 if __name__ == "__main__":
     main()
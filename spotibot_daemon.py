@@ -0,0 +1,180 @@
+############# EXPLICACION ##############
+# Modo servicio (python spotibot_core.py --daemon): SpotiBOT queda en marcha y sincroniza cada playlist de
+# origen cuando le toca según su intervalo, en lugar de arrancar en frío desde cron cada vez.
+# El cliente de Spotify, el índice de playlists y la caché de portadas se mantienen entre ciclos.
+# Intervalos (de más a menos prioritario):
+#   - tercera columna de playlists.txt:  https://open.spotify.com/playlist/XXXX TECHNO 6h
+#   - SPOTIBOT_INTERVAL_<GÉNERO>=12h en config.txt
+#   - SPOTIBOT_INTERVAL=24h en config.txt (por defecto 24h)
+# Cada ciclo busca novedades desde la última sincronización correcta de sus playlists (nunca menos que su
+# intervalo), así que una caída o una racha de fallos no deja canciones sin añadir. La primera vez se usa --dias.
+import math
+import os
+import random
+import signal
+import threading
+import time
+
+from spotibot_pipeline import GENRE_WORKERS, SyncContext, run_genres
+from spotibot_state import DATA_DIR, CoverStore, JsonState, PlaylistIndex
+
+SYNC_INTERVAL = "24h"  # Intervalo por defecto (SPOTIBOT_INTERVAL en config.txt)
+JITTER = 0.1  # Margen aleatorio sobre el intervalo (SPOTIBOT_JITTER), para que no coincidan todas las playlists
+RETRY_DELAY = 15 * 60  # Segundos hasta reintentar una playlist que falló
+COALESCE = 60  # Playlists que vencen en este margen se sincronizan en el mismo ciclo
+UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def parse_interval(value):
+    """Convierte '90s', '30m', '6h', '1d' (o un número de segundos) a segundos."""
+    text = str(value).strip().lower()
+    unit = UNITS.get(text[-1:])
+    try:
+        seconds = float(text[:-1] if unit else text) * (unit or 1)
+    except ValueError:
+        raise ValueError(f"Intervalo no válido: '{value}'")
+    if seconds <= 0:
+        raise ValueError(f"Intervalo no válido: '{value}'")
+    return seconds
+
+
+def playlist_interval(config, genre, playlist):
+    value = playlist.get("interval") or config.get(f"SPOTIBOT_INTERVAL_{genre.upper()}") \
+        or config.get("SPOTIBOT_INTERVAL", SYNC_INTERVAL)
+    try:
+        return parse_interval(value)
+    except ValueError as e:
+        print(f"{e} para {playlist['url']}, se usa {SYNC_INTERVAL}.")
+        return parse_interval(SYNC_INTERVAL)
+
+
+# === Calendario persistente ===
+class SyncSchedule(JsonState):
+    """Calendario de cada playlist de origen en cada género: {género: {playlist_id: {"next", "synced"}}}.
+
+    "next" es la próxima sincronización y "synced" el inicio de la última correcta (epoch). Se guarda para respetar
+    los intervalos tras un reinicio. Una playlist en dos géneros sigue el intervalo de cada uno.
+    """
+
+    def __init__(self, file_path=os.path.join(DATA_DIR, "schedule.json")):
+        super().__init__(file_path)
+        # Las versiones anteriores guardaban {playlist_id: epoch}: esas playlists vencen en el primer ciclo
+        self.data = {key: value for key, value in self.data.items() if isinstance(value, dict)}
+
+    def _entry(self, genre, playlist_id):
+        entry = self.data.get(genre, {}).get(playlist_id, {})
+        return entry if isinstance(entry, dict) else {"next": entry}  # Antes solo se guardaba la próxima
+
+    def next_run(self, genre, playlist_id):
+        return self._entry(genre, playlist_id).get("next", 0)
+
+    def last_sync(self, genre, playlist_id):
+        """Inicio de la última sincronización correcta, o None si nunca se sincronizó."""
+        return self._entry(genre, playlist_id).get("synced")
+
+    def reschedule(self, genre, playlist_id, delay, synced=None):
+        """Programa la siguiente sincronización; 'synced' marca el inicio de una sincronización correcta."""
+        with self.lock:
+            entry = self._entry(genre, playlist_id)
+            entry["next"] = time.time() + delay
+            if synced is not None:
+                entry["synced"] = synced
+            self.data.setdefault(genre, {})[playlist_id] = entry
+
+
+# === Servicio ===
+class SyncDaemon:
+    """Ejecuta ciclos de sincronización con las playlists que vencen, reutilizando cliente y cachés."""
+
+    def __init__(self, sp, user_id, config, load_playlists, dias, process_genre, schedule=None):
+        self.sp = sp
+        self.user_id = user_id
+        self.config = config
+        self.load_playlists = load_playlists  # Se relee en cada ciclo: los cambios en playlists.txt no exigen reiniciar
+        self.dias = dias  # Días de novedades de las playlists que nunca se han sincronizado
+        self.process_genre = process_genre
+        self.schedule = schedule if schedule is not None else SyncSchedule()
+        self.jitter = float(config.get("SPOTIBOT_JITTER", JITTER))
+        self.index = PlaylistIndex(ttl=int(config.get("SPOTIBOT_INDEX_TTL", 3600)))
+        self.covers = CoverStore()
+        self.stop_event = threading.Event()
+
+    def due_playlists(self, playlists_by_genre, now):
+        due = {}
+        for genre, playlists in playlists_by_genre.items():
+            ready = [p for p in playlists if self.schedule.next_run(genre, p['id']) <= now + COALESCE]
+            if ready:
+                due[genre] = ready
+        return due
+
+    def lookback_days(self, due, now):
+        """Días de novedades del ciclo: el mayor de los de sus playlists.
+
+        Cada una cuenta desde su última sincronización correcta y nunca menos que su intervalo; las que nunca se
+        sincronizaron usan self.dias. Se redondea hacia arriba para no perder canciones en el borde.
+        """
+        lookbacks = []
+        for genre, playlists in due.items():
+            for playlist in playlists:
+                synced = self.schedule.last_sync(genre, playlist['id'])
+                if synced is None:
+                    lookbacks.append(self.dias)
+                else:
+                    seconds = max(now - synced, playlist_interval(self.config, genre, playlist))
+                    lookbacks.append(math.ceil(seconds / UNITS["d"] * 100) / 100)
+        return max(lookbacks)
+
+    def run_cycle(self):
+        """Sincroniza las playlists que vencen. Devuelve el calendario de las siguientes."""
+        playlists_by_genre = self.load_playlists()
+        started = time.time()
+        due = self.due_playlists(playlists_by_genre, started)
+        if due:
+            total = sum(len(playlists) for playlists in due.values())
+            dias = self.lookback_days(due, started)
+            print(f"\nCiclo de sincronización: {total} playlists de {len(due)} géneros (últimos {dias} días).")
+            ctx = SyncContext(self.sp, self.user_id, self.config, dias, index=self.index, covers=self.covers)
+            try:
+                ctx.start()
+                results = run_genres(ctx, due, self.process_genre,
+                                     int(self.config.get("SPOTIBOT_GENRE_WORKERS", GENRE_WORKERS)))
+            finally:
+                ctx.close()
+                report = ctx.write_report()
+
+            for genre, playlists in due.items():
+                for playlist in playlists:
+                    failed = (isinstance(results[genre], Exception) or playlist['id'] in ctx.fetcher.errors
+                              or (genre, playlist['id']) in ctx.failed)
+                    if failed:
+                        delay = min(RETRY_DELAY, playlist_interval(self.config, genre, playlist))
+                        self.schedule.reschedule(genre, playlist['id'], delay)
+                    else:
+                        interval = playlist_interval(self.config, genre, playlist)
+                        delay = interval + random.uniform(0, interval * self.jitter)
+                        self.schedule.reschedule(genre, playlist['id'], delay, synced=started)
+            self.schedule.save()
+            calls = report.get("api", {}).get("total_calls", 0)
+            print(f"Ciclo terminado en {report['duration_seconds']:.0f}s con {calls} llamadas a la API.")
+        return [self.schedule.next_run(genre, p['id'])
+                for genre, playlists in playlists_by_genre.items() for p in playlists]
+
+    def run(self):
+        if threading.current_thread() is threading.main_thread():
+            for sig in (signal.SIGINT, signal.SIGTERM):
+                signal.signal(sig, lambda *_: self.stop())
+        print("SpotiBOT en modo servicio. Ctrl+C para salir (se termina el ciclo en curso).")
+        while not self.stop_event.is_set():
+            try:
+                next_runs = self.run_cycle()
+            except Exception as e:
+                print(f"Error en el ciclo de sincronización: {e}")
+                next_runs = [time.time() + RETRY_DELAY]
+            wait = max(0, min(next_runs, default=time.time() + RETRY_DELAY) - time.time())
+            if not self.stop_event.is_set():
+                print(f"Próxima sincronización en {wait / 60:.1f} minutos.")
+            self.stop_event.wait(wait)
+        print("Modo servicio detenido.")
+
+    def stop(self):
+        self.stop_event.set()
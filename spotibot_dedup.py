@@ -0,0 +1,98 @@
+############# EXPLICACION ##############
+# Deduplicación por grabación además de por ID de Spotify.
+# Una misma canción publicada en varios álbumes o sellos tiene IDs distintos pero el mismo ISRC; cada
+# canción añadida se registra en el historial con una clave de grabación ('isrc:...' o, si no tiene ISRC,
+# 'title:artista título' normalizado) y las candidatas cuya clave ya existe se descartan. Si el artista o el
+# título quedan vacíos al normalizarlos no hay clave y la canción solo se deduplica por ID.
+# Las canciones del historial anterior se completan poco a poco pidiendo su ISRC en lotes de 50.
+import re
+import unicodedata
+
+from spotibot_scheduler import api_errors
+from spotibot_store import GLOBAL_SCOPE, RECORDED_IDS_SCOPE, RECORDING_SCOPE
+
+TRACKS_PER_REQUEST = 50  # Máximo de IDs por llamada al endpoint de canciones
+BACKFILL_LIMIT = 500  # Canciones antiguas del historial completadas por ejecución (SPOTIBOT_ISRC_BACKFILL)
+# Artistas invitados: entre paréntesis o corchetes, o sin ellos hasta el siguiente " - " (p. ej. " - Extended Mix")
+FEATURING = re.compile(r"[\(\[]\s*(feat|ft|featuring)\b[^\)\]]*[\)\]]|\s(feat|ft|featuring)\b.*?(?=\s-\s|$)",
+                       re.IGNORECASE)
+
+
+def normalize_text(text):
+    """Minúsculas y sin tildes ni signos, conservando las letras de cualquier alfabeto."""
+    chars = []
+    for char in unicodedata.normalize("NFKD", text or ""):
+        if unicodedata.combining(char) and chars and chars[-1].isascii():
+            continue  # Tildes del alfabeto latino (é -> e); en otros alfabetos (й, ド) forman parte de la letra
+        chars.append(char)
+    text = unicodedata.normalize("NFC", "".join(chars))
+    return " ".join(re.findall(r"\w+", text.casefold()))
+
+
+def normalize_title(name):
+    return normalize_text(FEATURING.sub(" ", name or ""))  # Los artistas invitados cambian de un lanzamiento a otro
+
+
+def recording_key(isrc, artist, name):
+    """Clave de grabación: el ISRC si lo hay; si no, artista + título normalizados.
+
+    None (solo se deduplica por ID) si el artista o el título quedan vacíos al normalizarlos.
+    """
+    if isrc:
+        return f"isrc:{isrc.strip().upper()}"
+    artist, title = normalize_text(artist), normalize_title(name)
+    return f"title:{artist} {title}" if artist and title else None
+
+
+def track_key(track):
+    return recording_key(track.isrc, track.artist, track.name)
+
+
+# === Índice de grabaciones ===
+class RecordingIndex:
+    """Comprueba y reserva claves de grabación en el TrackStore (mismo mecanismo que los IDs en el ámbito global)."""
+
+    def __init__(self, store):
+        self.store = store
+
+    def claim(self, tracks, exclude_keys=frozenset()):
+        """Devuelve (canciones cuya grabación aún no se ha añadido, claves reservadas).
+
+        Las canciones sin clave se dejan pasar (solo se deduplican por ID). Hay que liberar las claves
+        con release() si luego no se llegan a añadir.
+        """
+        keyed = [(track, track_key(track)) for track in tracks]
+        keys = [key for _, key in keyed if key and key not in exclude_keys]
+        claimed = self.store.claim(RECORDING_SCOPE, keys)
+        selected = []
+        seen = set()
+        for track, key in keyed:
+            if key is None:
+                selected.append(track)
+            elif key in claimed and key not in seen:  # Dos versiones de la misma grabación en el lote: solo una
+                seen.add(key)
+                selected.append(track)
+        return selected, claimed
+
+    def release(self, keys):
+        self.store.release(RECORDING_SCOPE, keys)
+
+    def backfill(self, sp, limit=BACKFILL_LIMIT):
+        """Registra la clave de grabación de canciones del historial global que aún no la tienen."""
+        track_ids = self.store.missing_ids(GLOBAL_SCOPE, RECORDED_IDS_SCOPE, limit)
+        done = 0
+        for start in range(0, len(track_ids), TRACKS_PER_REQUEST):
+            batch = track_ids[start:start + TRACKS_PER_REQUEST]
+            try:
+                tracks = sp.tracks(batch)["tracks"]
+            except api_errors() as e:
+                print(f"No se pudieron obtener los ISRC del historial: {e}")
+                break
+            keys = [recording_key((t.get("external_ids") or {}).get("isrc"), (t.get("artists") or [{}])[0].get("name"),
+                                  t.get("name")) for t in tracks if t]
+            self.store.add(RECORDING_SCOPE, [key for key in keys if key])
+            self.store.add(RECORDED_IDS_SCOPE, batch)
+            done += len(batch)
+        if done:
+            print(f"Completadas las claves de grabación de {done} canciones del historial.")
+        return done
@@ -0,0 +1,232 @@
+############# EXPLICACION ##############
+# Motor de descarga concurrente de playlists para spotibot_core.py y TelegramSpotiBOT.py
+# Descarga todas las playlists de origen a la vez y, dentro de cada una, pide todas las
+# páginas en paralelo calculando los offsets a partir del 'total' de la primera respuesta (avanzando lo que
+# el servidor devolvió en ella, que puede ser menos de lo pedido). Si al final faltan items, la playlist
+# queda en 'errors' para no darla por procesada.
+# Solo se piden a la API los campos que se usan y cada item se guarda como un TrackItem compacto.
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from spotibot_scheduler import RATE_LIMIT, RequestScheduler, ScheduledSpotify, api_errors
+
+# === Valores por defecto (se pueden cambiar en config.txt) ===
+PAGE_SIZE = 100  # Máximo de elementos por página que permite la API
+MAX_WORKERS = 8  # Peticiones simultáneas como máximo
+ITEM_FIELDS = "items(added_at,track(id,uri,name,external_ids(isrc),artists(name))),total,next"  # Campos por página
+
+# Item de playlist reducido a lo que usan los filtros; id/uri son None para ficheros locales o canciones no disponibles.
+# isrc y artist (primer artista) sirven para deduplicar la misma grabación publicada con varios IDs
+TrackItem = namedtuple("TrackItem", ["id", "uri", "added_at", "name", "isrc", "artist"], defaults=(None, None))
+
+
+# === Motor de descarga ===
+class PlaylistFetcher:
+    """Descarga los items de una o varias playlists en paralelo."""
+
+    def __init__(self, sp, max_workers=MAX_WORKERS, rate=RATE_LIMIT, page_size=PAGE_SIZE, recent_only=True):
+        # Las llamadas pasan por el planificador (límite de ritmo y reintentos); si el cliente
+        # no viene ya planificado se le pone uno propio
+        if not isinstance(sp, ScheduledSpotify):
+            sp = ScheduledSpotify(sp, RequestScheduler(rate=rate))
+        self.sp = sp
+        self.max_workers = max(1, int(max_workers))
+        self.page_size = page_size
+        self.recent_only = recent_only
+        self.errors = {}  # playlist_id -> excepción que impidió completar la descarga
+
+    @classmethod
+    def from_config(cls, sp, config):
+        """Crea el motor con las claves SPOTIBOT_* opcionales de config.txt."""
+        return cls(
+            sp,
+            max_workers=int(config.get("SPOTIBOT_MAX_WORKERS", MAX_WORKERS)),
+            rate=float(config.get("SPOTIBOT_RATE_LIMIT", RATE_LIMIT)),
+            recent_only=config.get("SPOTIBOT_RECENT_FETCH", "1") != "0",
+        )
+
+    def _get_page(self, playlist_id, offset):
+        page = self.sp.playlist_items(playlist_id, limit=self.page_size, offset=offset, market='from_token',
+                                      fields=ITEM_FIELDS)
+        page['items'] = compact_items(page['items'])
+        return page
+
+    def _first_page(self, playlist_id):
+        try:
+            return self._get_page(playlist_id, 0)
+        except api_errors() as e:
+            self.errors[playlist_id] = e
+            if getattr(e, 'http_status', None) == 404:
+                print(f"Playlist {playlist_id} no encontrada o no accesible (error 404).")
+            else:
+                print(f"Error al obtener canciones de la playlist {playlist_id}: {e}")
+            return None
+
+    def _offsets(self, page):
+        """Offsets del resto de páginas: se avanza lo que devolvió la primera, no lo que se pidió."""
+        if not page['next']:
+            return range(0)
+        step = len(page['items']) or self.page_size
+        return range(len(page['items']), page.get('total') or len(page['items']), step)
+
+    def _check_complete(self, playlist_id, items, page):
+        """Anota como error una descarga completa que no trae todos los items del 'total'."""
+        total = page.get('total')
+        if playlist_id not in self.errors and total is not None and len(items) != total:
+            self.errors[playlist_id] = RuntimeError(f"se descargaron {len(items)} de {total} canciones")
+            print(f"Error al obtener canciones de la playlist {playlist_id}: {self.errors[playlist_id]}")
+
+    def fetch_many(self, playlist_ids):
+        """Devuelve {playlist_id: [TrackItem]} con los items en el mismo orden que la API."""
+        playlist_ids = list(dict.fromkeys(playlist_ids))
+        results = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            # Fase 1: primera página de cada playlist (nos da el 'total')
+            first_pages = dict(zip(playlist_ids, executor.map(self._first_page, playlist_ids)))
+
+            # Fase 2: resto de páginas de todas las playlists, todas a la vez
+            pending = {}
+            for playlist_id, page in first_pages.items():
+                if not page:
+                    results[playlist_id] = []
+                    continue
+                if not page['items']:
+                    print(f"La playlist {playlist_id} no tiene canciones o no se pudo acceder.")
+                offsets = self._offsets(page)
+                pending[playlist_id] = (page, [executor.submit(self._get_page, playlist_id, o) for o in offsets])
+
+            for playlist_id, (page, futures) in pending.items():
+                items = list(page['items'])
+                for future in futures:
+                    try:
+                        items.extend(future.result()['items'])
+                    except api_errors() as e:
+                        # Igual que antes: nos quedamos con lo descargado hasta el fallo
+                        self.errors[playlist_id] = e
+                        print(f"Error al obtener canciones de la playlist {playlist_id}: {e}")
+                        for f in futures:
+                            f.cancel()
+                        break
+                self._check_complete(playlist_id, items, page)
+                results[playlist_id] = items
+        return results
+
+    def fetch_playlist(self, playlist_id):
+        return self.fetch_many([playlist_id])[playlist_id]
+
+    def _fetch_rest(self, playlist_id, page):
+        """Completa una playlist a partir de su primera página (escaneo completo en paralelo)."""
+        items = list(page['items'])
+        offsets = self._offsets(page)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [executor.submit(self._get_page, playlist_id, o) for o in offsets]
+            for future in futures:
+                try:
+                    items.extend(future.result()['items'])
+                except api_errors() as e:
+                    self.errors[playlist_id] = e
+                    print(f"Error al obtener canciones de la playlist {playlist_id}: {e}")
+                    for f in futures:
+                        f.cancel()
+                    break
+        self._check_complete(playlist_id, items, page)
+        return items
+
+    def _fetch_recent(self, playlist_id, cutoff):
+        """Descarga desde el final de la playlist hacia atrás y para en cuanto una página entera es anterior al corte.
+
+        Solo es válido si la playlist está ordenada por 'added_at' (el orden por defecto de Spotify);
+        si se detecta otro orden se vuelve al escaneo completo.
+        """
+        page = self._first_page(playlist_id)
+        if not page:
+            return []
+        items = page['items']
+        if not page['next']:
+            return list(items)
+        if not _is_chronological(items) or _added_at(items[-1]) >= cutoff:
+            # Toda la playlist cae dentro de la ventana (o no está ordenada): hay que leerla entera
+            return self._fetch_rest(playlist_id, page)
+
+        newest_first = []
+        boundary = None  # 'added_at' más antiguo de la última página leída
+        for offset in reversed(self._offsets(page)):
+            try:
+                page_items = self._get_page(playlist_id, offset)['items']
+            except api_errors() as e:
+                self.errors[playlist_id] = e
+                print(f"Error al obtener canciones de la playlist {playlist_id}: {e}")
+                break
+            if not page_items:
+                continue
+            if not _is_chronological(page_items) or (boundary is not None and _added_at(page_items[-1]) > boundary):
+                print(f"La playlist {playlist_id} no está ordenada por fecha de adición, se descarga entera.")
+                return self._fetch_rest(playlist_id, page)
+            newest_first.append(page_items)
+            boundary = _added_at(page_items[0])
+            if _added_at(page_items[-1]) < cutoff:
+                break
+        return [item for page_items in reversed(newest_first) for item in page_items]
+
+    def fetch_many_recent(self, playlist_ids, cutoff):
+        """Como fetch_many, pero solo garantiza los items añadidos desde 'cutoff' (mismo formato que 'added_at')."""
+        playlist_ids = list(dict.fromkeys(playlist_ids))
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return dict(zip(playlist_ids, executor.map(lambda pid: self._fetch_recent(pid, cutoff), playlist_ids)))
+
+    def _get_snapshot_id(self, playlist_id):
+        try:
+            return self.sp.playlist(playlist_id, fields="snapshot_id")["snapshot_id"]
+        except api_errors() as e:
+            print(f"No se pudo obtener el snapshot de la playlist {playlist_id}: {e}")
+            return None
+
+    def fetch_snapshot_ids(self, playlist_ids):
+        """Devuelve {playlist_id: snapshot_id} con una petición ligera por playlist (None si falla)."""
+        playlist_ids = list(dict.fromkeys(playlist_ids))
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return dict(zip(playlist_ids, executor.map(self._get_snapshot_id, playlist_ids)))
+
+
+# === Sincronización incremental por snapshot_id ===
+def fetch_changed_playlists(fetcher, genre, playlist_ids, snapshots, cutoff):
+    """Descarga solo las playlists cuyo snapshot_id ha cambiado desde que 'genre' las procesó.
+
+    Devuelve ({playlist_id: [items]}, {playlist_id: snapshot_id}); las playlists sin cambios
+    aparecen con una lista vacía porque todos sus items ya se procesaron.
+    """
+    playlist_ids = list(dict.fromkeys(playlist_ids))
+    snapshot_ids = fetcher.fetch_snapshot_ids(playlist_ids)
+    changed = [pid for pid in playlist_ids if not snapshots.is_unchanged(genre, pid, snapshot_ids[pid], cutoff)]
+    skipped = len(playlist_ids) - len(changed)
+    if skipped:
+        print(f"{skipped} playlists sin cambios desde la última ejecución, se omite su descarga.")
+    if fetcher.recent_only:
+        tracks_by_playlist = fetcher.fetch_many_recent(changed, cutoff)
+    else:
+        tracks_by_playlist = fetcher.fetch_many(changed)
+    for playlist_id in playlist_ids:
+        tracks_by_playlist.setdefault(playlist_id, [])
+    return tracks_by_playlist, snapshot_ids
+
+
+# === Utilidades ===
+def compact_items(items):
+    """Convierte items de la API (diccionarios) en TrackItem."""
+    compact = []
+    for item in items:
+        track = item.get('track') or {}
+        artists = track.get('artists') or [{}]
+        # Las playlists muy antiguas pueden no tener fecha de adición
+        compact.append(TrackItem(track.get('id'), track.get('uri'), item.get('added_at') or "", track.get('name'),
+                                 (track.get('external_ids') or {}).get('isrc'), artists[0].get('name')))
+    return compact
+
+
+def _added_at(item):
+    return item.added_at
+
+
+def _is_chronological(items):
+    dates = [_added_at(item) for item in items]
+    return all(a <= b for a, b in zip(dates, dates[1:]))
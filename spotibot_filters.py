@@ -0,0 +1,79 @@
+############# EXPLICACION ##############
+# Selección de novedades en una sola pasada sobre los TrackItem descargados.
+# Las fechas 'added_at' de Spotify vienen en ISO-8601 UTC ('2024-05-01T10:20:30Z'): en ese formato el
+# orden como texto es el mismo que como fecha, así que se comparan directamente con la fecha de corte
+# (cutoff_timestamp) sin parsearlas. Solo las que llegan en otro formato se parsean, una única vez.
+import datetime
+
+TIMESTAMP_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+TIMESTAMP_LENGTH = len("2024-01-01T00:00:00Z")
+
+
+def normalize_added_at(value):
+    """Devuelve 'value' en el formato de cutoff_timestamp() o None si no es una fecha válida."""
+    if not value:
+        return None
+    if len(value) == TIMESTAMP_LENGTH and value[10] == "T" and value[-1] == "Z":
+        return value  # Formato habitual de la API: se compara tal cual
+    try:
+        parsed = datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+    return parsed.astimezone(datetime.timezone.utc).strftime(TIMESTAMP_FORMAT)
+
+
+def is_recent(track, cutoff):
+    added_at = normalize_added_at(track.added_at)
+    return added_at is not None and added_at >= cutoff
+
+
+def classify_tracks(tracks, cutoff, exclusions=(), seen=None, skipped=None):
+    """Elige en una pasada las canciones con id, añadidas desde 'cutoff', fuera de 'exclusions' y sin repetir.
+
+    'exclusions' es [(motivo, conjunto de IDs)] (historial, playlist de destino, altas pendientes...) y
+    'seen' acumula los IDs ya aceptados (para compartirlo entre las playlists de un género).
+    Si se pasa la lista 'skipped' se le añaden las descartadas como (canción, motivo), con motivos
+    'no_id', 'invalid_date', 'old', los de 'exclusions' o 'repeat'.
+    """
+    seen = set() if seen is None else seen
+    skip = skipped.append if skipped is not None else None
+    selected = []
+    invalid = 0
+    for track in tracks:
+        track_id = track.id
+        if not track_id:
+            if skip:
+                skip((track, "no_id"))
+            continue
+        added_at = track.added_at
+        if len(added_at) != TIMESTAMP_LENGTH or added_at[-1] != "Z":
+            added_at = normalize_added_at(added_at)  # Solo las fechas en otro formato se parsean
+            if added_at is None:
+                invalid += 1
+                if skip:
+                    skip((track, "invalid_date"))
+                continue
+        if added_at < cutoff:
+            if skip:
+                skip((track, "old"))
+            continue
+        reason = next((reason for reason, excluded in exclusions if track_id in excluded), None)
+        if reason is None and track_id not in seen:
+            seen.add(track_id)
+            selected.append(track)
+        elif skip:
+            skip((track, reason or "repeat"))
+    if invalid:
+        print(f"Advertencia: {invalid} canciones sin fecha de adición válida, se omiten.")
+    return selected
+
+
+def select_tracks(tracks, cutoff, excluded=frozenset()):
+    """Filtra en una pasada: canciones con id, añadidas desde 'cutoff', que no están en 'excluded' y sin repetir.
+
+    Equivale a filter_new_tracks + filter_recent_tracks + filter_duplicate_tracks con un único
+    conjunto de exclusión (historial, playlist de destino y altas pendientes).
+    """
+    return classify_tracks(tracks, cutoff, [("excluded", excluded)])
@@ -0,0 +1,147 @@
+############# EXPLICACION ##############
+# Caché en disco de las respuestas GET de la API de Spotify (data/http_cache/).
+# Cuando una respuesta trae ETag o Last-Modified se guarda su cuerpo; la siguiente vez se pide con
+# If-None-Match / If-Modified-Since y, si Spotify contesta 304 (sin cambios), se devuelve el cuerpo guardado
+# sin volver a descargarlo. Se monta como adaptador de la sesión HTTP del cliente, así que spotipy y el resto
+# del código no notan la diferencia. Al superar SPOTIBOT_HTTP_CACHE_MB se borran las entradas usadas hace más
+# tiempo (la fecha de modificación de cada fichero hace de marca de uso).
+import hashlib
+import json
+import os
+import threading
+
+from requests.adapters import HTTPAdapter
+
+from spotibot_state import DATA_DIR
+
+CACHE_DIR = os.path.join(DATA_DIR, "http_cache")
+CACHE_SIZE_MB = 50  # Tamaño máximo de la caché en disco (SPOTIBOT_HTTP_CACHE_MB, 0 la desactiva)
+EVICT_RATIO = 0.8  # Al desalojar se baja hasta este porcentaje del máximo para no recorrer la carpeta en cada alta
+
+
+# === Caché de respuestas ===
+class ResponseCache:
+    """Un fichero por URL: una línea JSON con url, etag, last_modified y content_type, seguida del cuerpo."""
+
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=CACHE_SIZE_MB * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.size = None  # Bytes ocupados en disco (se calcula en la primera alta)
+        self.lock = threading.Lock()
+        self.counters = {"cache_hits": 0, "cache_misses": 0, "cache_bytes_saved": 0}
+
+    @classmethod
+    def from_config(cls, config):
+        """Caché con SPOTIBOT_HTTP_CACHE_MB de config.txt; None si está desactivada."""
+        size_mb = float(config.get("SPOTIBOT_HTTP_CACHE_MB", CACHE_SIZE_MB))
+        return cls(max_bytes=int(size_mb * 1024 * 1024)) if size_mb > 0 else None
+
+    def _path(self, url):
+        return os.path.join(self.cache_dir, hashlib.sha256(url.encode()).hexdigest())
+
+    def get(self, url):
+        """(meta, cuerpo) guardados para 'url', o None."""
+        try:
+            with open(self._path(url), "rb") as f:
+                meta = json.loads(f.readline())
+                body = f.read()
+        except (OSError, ValueError):
+            return None
+        return (meta, body) if meta.get("url") == url else None
+
+    def hit(self, url, body):
+        """Cuenta una respuesta servida desde la caché y la marca como usada."""
+        try:
+            os.utime(self._path(url))
+        except OSError:
+            pass
+        with self.lock:
+            self.counters["cache_hits"] += 1
+            self.counters["cache_bytes_saved"] += len(body)
+
+    def miss(self):
+        with self.lock:
+            self.counters["cache_misses"] += 1
+
+    def put(self, url, headers, body):
+        meta = {"url": url, "etag": headers.get("ETag"), "last_modified": headers.get("Last-Modified"),
+                "content_type": headers.get("Content-Type")}
+        data = json.dumps(meta).encode() + b"\n" + body
+        if len(data) > self.max_bytes:
+            return
+        path = self._path(url)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            with self.lock:
+                if self.size is None:
+                    self.size = self._disk_size()
+                old_size = os.path.getsize(path) if os.path.exists(path) else 0
+                os.replace(tmp_path, path)
+                self.size += len(data) - old_size
+                if self.size > self.max_bytes:
+                    self._evict()
+        except OSError as e:  # Sin caché se sigue funcionando, solo se descarga de nuevo la próxima vez
+            print(f"No se pudo guardar en la caché HTTP: {e}")
+
+    def _entries(self):
+        if not os.path.isdir(self.cache_dir):
+            return []
+        return [entry for entry in os.scandir(self.cache_dir) if entry.is_file() and not entry.name.endswith(".tmp")]
+
+    def _disk_size(self):
+        return sum(entry.stat().st_size for entry in self._entries())
+
+    def _evict(self):
+        """Borra las entradas usadas hace más tiempo hasta bajar de EVICT_RATIO del máximo (con el lock tomado)."""
+        for entry in sorted(self._entries(), key=lambda entry: entry.stat().st_mtime):
+            if self.size <= self.max_bytes * EVICT_RATIO:
+                break
+            size = entry.stat().st_size
+            try:
+                os.remove(entry.path)
+            except OSError:
+                continue
+            self.size -= size
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counters)
+
+
+# === Adaptador HTTP con peticiones condicionales ===
+class CachingAdapter(HTTPAdapter):
+    """HTTPAdapter que hace condicionales los GET ya guardados y convierte los 304 en la respuesta guardada."""
+
+    def __init__(self, cache, **kwargs):
+        super().__init__(**kwargs)
+        self.cache = cache
+
+    def send(self, request, **kwargs):
+        if request.method != "GET":
+            return super().send(request, **kwargs)
+        cached = self.cache.get(request.url)
+        if cached:
+            meta, body = cached
+            if meta.get("etag"):
+                request.headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                request.headers["If-Modified-Since"] = meta["last_modified"]
+
+        response = super().send(request, **kwargs)
+        if response.status_code == 304 and cached:
+            self.cache.hit(request.url, body)
+            response.status_code = 200
+            response.reason = "OK"
+            response._content = body
+            if meta.get("content_type"):
+                response.headers["Content-Type"] = meta["content_type"]
+            response.headers["Content-Length"] = str(len(body))
+            return response
+
+        self.cache.miss()
+        if response.status_code == 200 and (response.headers.get("ETag") or response.headers.get("Last-Modified")):
+            self.cache.put(request.url, response.headers, response.content)
+        return response
@@ -0,0 +1,121 @@
+############# EXPLICACION ##############
+# Lectura de config.txt y playlists.txt a través de un manifiesto cacheado (data/manifest.json).
+# Cada fichero se interpreta y valida una sola vez: mientras no cambien su fecha de modificación ni su
+# tamaño se reutiliza el resultado guardado, y los avisos de validación solo se muestran al recompilarlo.
+# config.txt lleva secretos (SPOTIPY_CLIENT_SECRET): de él solo se guarda la firma para no repetir los avisos,
+# y se vuelve a leer cada vez.
+import os
+import re
+
+from spotibot_daemon import parse_interval
+from spotibot_state import DATA_DIR, JsonState
+
+MANIFEST_FILE = os.path.join(DATA_DIR, "manifest.json")
+PLAYLIST_ID = re.compile(r"(?:playlist/|spotify:playlist:)([A-Za-z0-9]+)")
+
+# Claves numéricas de config.txt: si no son un número se avisa y se usa el valor por defecto
+INT_KEYS = {"SPOTIBOT_MAX_WORKERS", "SPOTIBOT_GENRE_WORKERS", "SPOTIBOT_MAX_RETRIES", "SPOTIBOT_INDEX_TTL",
+            "SPOTIBOT_ISRC_BACKFILL", "SPOTIBOT_RECENT_FETCH", "SPOTIBOT_ROTATION_SIZE", "SPOTIBOT_ROTATION_DAYS",
+            "SPOTIBOT_ACCOUNT_WORKERS"}
+FLOAT_KEYS = {"SPOTIBOT_RATE_LIMIT", "SPOTIBOT_JITTER", "SPOTIBOT_HTTP_CACHE_MB"}
+UNCACHED_PARSERS = {"parse_config"}  # Intérpretes cuyo resultado no se escribe en el manifiesto
+
+
+# === Intérpretes ===
+def parse_config(lines):
+    """Una clave CLAVE=valor por línea; se ignoran las líneas vacías y los comentarios (#).
+
+    Devuelve (config, avisos).
+    """
+    config, warnings = {}, []
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        key, sep, value = line.partition("=")
+        key, value = key.strip(), value.strip()
+        if not sep or not key:
+            warnings.append(f"línea {number}: se esperaba CLAVE=valor")
+            continue
+        number_type = int if key in INT_KEYS else float if key in FLOAT_KEYS else None
+        if number_type:
+            try:
+                number_type(value)
+            except ValueError:
+                warnings.append(f"línea {number}: {key} debe ser un número, se usa el valor por defecto")
+                continue
+        config[key] = value
+    return config, warnings
+
+
+def parse_playlists(lines):
+    """'URL GÉNERO [intervalo]' por línea. Devuelve ([{id, url, genre, interval?}], avisos)."""
+    playlists, warnings = [], []
+    seen = set()
+    for number, line in enumerate(lines, 1):
+        parts = line.split()
+        if not parts or parts[0].startswith("#"):
+            continue
+        if len(parts) < 2:  # Sin género
+            warnings.append(f"línea {number}: falta el género")
+            continue
+        match = PLAYLIST_ID.search(parts[0])
+        if not match:
+            warnings.append(f"línea {number}: '{parts[0]}' no es una URL de playlist")
+            continue
+        playlist = {"id": f"spotify:playlist:{match.group(1)}", "url": parts[0], "genre": parts[1]}
+        if (playlist["genre"], playlist["id"]) in seen:
+            warnings.append(f"línea {number}: playlist repetida en {parts[1]}")
+            continue
+        seen.add((playlist["genre"], playlist["id"]))
+        if len(parts) > 2:  # Intervalo opcional para el modo servicio (p. ej. 6h)
+            try:
+                parse_interval(parts[2])
+                playlist["interval"] = parts[2]
+            except ValueError as e:
+                warnings.append(f"línea {number}: {e}, se usa el intervalo por defecto")
+        playlists.append(playlist)
+    return playlists, warnings
+
+
+# === Manifiesto ===
+class Manifest(JsonState):
+    """{ruta absoluta: {"signature": [mtime_ns, tamaño], "parser", "value"}} de cada fichero ya interpretado."""
+
+    def __init__(self, file_path=MANIFEST_FILE):
+        super().__init__(file_path)
+        # Las versiones anteriores guardaban también config.txt entero: se borra del disco
+        stale = [entry for entry in self.data.values() if entry.get("parser") in UNCACHED_PARSERS and "value" in entry]
+        for entry in stale:
+            del entry["value"]
+        if stale:
+            self._save()
+
+    def _save(self):
+        try:
+            self.save()
+        except OSError as e:  # Sin caché se sigue funcionando, solo se vuelve a interpretar la próxima vez
+            print(f"No se pudo guardar '{self.file_path}': {e}")
+
+    def load(self, path, parser):
+        """Devuelve el contenido interpretado de 'path', recompilándolo solo si el fichero ha cambiado."""
+        stat = os.stat(path)
+        key = os.path.abspath(path)
+        signature = [stat.st_mtime_ns, stat.st_size]
+        cached = parser.__name__ not in UNCACHED_PARSERS
+        entry = self.data.get(key)
+        unchanged = entry and entry["signature"] == signature and entry["parser"] == parser.__name__
+        if unchanged and cached:
+            return entry["value"]
+
+        with open(path, "r") as f:
+            value, warnings = parser(f)
+        if unchanged:  # Sin cambios pero sin contenido guardado: los avisos ya se mostraron
+            return value
+        for warning in warnings:
+            print(f"Aviso en {os.path.basename(path)}, {warning}.")
+        self.data[key] = {"signature": signature, "parser": parser.__name__}
+        if cached:
+            self.data[key]["value"] = value
+        self._save()
+        return value
@@ -0,0 +1,163 @@
+############# EXPLICACION ##############
+# Métricas de una ejecución: cuánto tarda cada etapa (autenticación, biblioteca, descarga, rotación,
+# filtrado, altas, portadas, guardado), cuántos elementos procesa y cuántas llamadas hace a la API.
+# Al terminar se guarda un informe JSON (data/last_run.json) y, si se configura SPOTIBOT_METRICS_FILE,
+# un fichero de texto en formato Prometheus para el textfile collector de node_exporter.
+import contextlib
+import datetime
+import os
+import threading
+import time
+
+from spotibot_state import DATA_DIR, JsonState
+
+REPORT_FILE = os.path.join(DATA_DIR, "last_run.json")
+STAGES = ["auth", "library", "fetch", "rotate", "filter", "add", "cover", "persist"]
+
+
+class _StageTimer:
+    def __init__(self):
+        self.items = 0
+
+
+# === Métricas de una ejecución ===
+class RunMetrics:
+    """Tiempos y contadores por etapa. Los géneros van en paralelo, así que el tiempo de cada etapa es acumulado."""
+
+    def __init__(self):
+        self.started = time.time()
+        self.finished = None
+        self.stages = {}  # etapa -> {"count", "seconds", "items"}
+        self.genres = {}  # género -> {"seconds", "added", "error"}
+        self.scheduler = None
+        self.api_baseline = None
+        self.lock = threading.Lock()
+
+    def track_api(self, scheduler):
+        """Cuenta las llamadas del planificador a partir de ahora (el bot reutiliza el mismo entre ejecuciones)."""
+        self.scheduler = scheduler
+        self.api_baseline = scheduler.stats()
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """Mide un bloque: with metrics.stage("fetch") as stage: ...; stage.items = n"""
+        timer = _StageTimer()
+        start = time.perf_counter()
+        try:
+            yield timer
+        finally:
+            self.record(name, time.perf_counter() - start, timer.items)
+
+    def record(self, name, seconds, items=0):
+        with self.lock:
+            entry = self.stages.setdefault(name, {"count": 0, "seconds": 0.0, "items": 0})
+            entry["count"] += 1
+            entry["seconds"] += seconds
+            entry["items"] += items
+
+    def record_genre(self, genre, seconds, result):
+        with self.lock:
+            entry = {"seconds": round(seconds, 3)}
+            if isinstance(result, Exception):
+                entry["error"] = str(result)
+            elif isinstance(result, int):
+                entry["added"] = result
+            self.genres[genre] = entry
+
+    def api_stats(self):
+        """Contadores del planificador durante esta ejecución."""
+        if self.scheduler is None:
+            return None
+        stats, base = self.scheduler.stats(), self.api_baseline
+        calls = {endpoint: count - base["calls"].get(endpoint, 0) for endpoint, count in stats["calls"].items()}
+        api = {key: stats[key] - base[key] for key in stats if key != "calls"}
+        api["wait_seconds"] = round(api["wait_seconds"], 3)
+        api["calls"] = {endpoint: count for endpoint, count in sorted(calls.items()) if count}
+        api["total_calls"] = sum(api["calls"].values())
+        return api
+
+    def report(self, **extra):
+        """Informe de la ejecución como diccionario (lo que se guarda en data/last_run.json)."""
+        with self.lock:
+            finished = self.finished or time.time()
+            report = {
+                "started_at": _iso(self.started),
+                "finished_at": _iso(finished),
+                "duration_seconds": round(finished - self.started, 3),
+                "stages": {name: {**entry, "seconds": round(entry["seconds"], 3)}
+                           for name, entry in sorted(self.stages.items(), key=lambda kv: _stage_order(kv[0]))},
+                "genres": dict(self.genres),
+            }
+        api = self.api_stats()
+        if api is not None:
+            report["api"] = api
+        report.update(extra)
+        return report
+
+
+# === Exportación ===
+def write_report(report, file_path=REPORT_FILE):
+    state = JsonState(file_path)
+    state.data = report
+    state.save()
+
+
+def write_prometheus(report, file_path):
+    """Escribe el informe en formato de texto de Prometheus (se reemplaza de forma atómica)."""
+    lines = []
+
+    def metric(name, help_text, samples):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} gauge")
+        for labels, value in samples:
+            label_text = ",".join(f'{key}="{_escape(val)}"' for key, val in labels.items())
+            lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+
+    finished = datetime.datetime.strptime(report["finished_at"], "%Y-%m-%dT%H:%M:%SZ")
+    metric("spotibot_last_run_timestamp_seconds", "Fin de la última ejecución (epoch).",
+           [({}, int(finished.replace(tzinfo=datetime.timezone.utc).timestamp()))])
+    metric("spotibot_last_run_success", "1 si la última ejecución terminó sin errores.",
+           [({}, 1 if report.get("status") == "ok" else 0)])
+    metric("spotibot_run_duration_seconds", "Duración de la última ejecución.", [({}, report["duration_seconds"])])
+    stages = report["stages"]
+    metric("spotibot_stage_seconds", "Tiempo acumulado por etapa.",
+           [({"stage": name}, entry["seconds"]) for name, entry in stages.items()])
+    metric("spotibot_stage_runs", "Veces que se ejecutó cada etapa.",
+           [({"stage": name}, entry["count"]) for name, entry in stages.items()])
+    metric("spotibot_stage_items", "Elementos procesados por etapa.",
+           [({"stage": name}, entry["items"]) for name, entry in stages.items()])
+    metric("spotibot_genre_seconds", "Tiempo de procesado de cada género.",
+           [({"genre": genre}, entry["seconds"]) for genre, entry in report["genres"].items()])
+    metric("spotibot_genre_tracks_added", "Canciones añadidas por género.",
+           [({"genre": genre}, entry.get("added", 0)) for genre, entry in report["genres"].items()])
+    api = report.get("api")
+    if api:
+        metric("spotibot_api_calls", "Llamadas a la API por endpoint (incluye reintentos).",
+               [({"endpoint": endpoint}, count) for endpoint, count in sorted(api["calls"].items())])
+        for key in ("retries", "throttled", "server_errors", "failures"):
+            metric(f"spotibot_api_{key}", f"Contador '{key}' del planificador de peticiones.", [({}, api[key])])
+        metric("spotibot_api_wait_seconds", "Tiempo esperado entre reintentos.", [({}, round(api["wait_seconds"], 3))])
+        for key in ("cache_hits", "cache_misses", "cache_bytes_saved"):
+            if key in api:
+                metric(f"spotibot_http_{key}", f"Contador '{key}' de la caché HTTP.", [({}, api[key])])
+
+    dir_path = os.path.dirname(file_path)
+    if dir_path:
+        os.makedirs(dir_path, exist_ok=True)
+    tmp_path = f"{file_path}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write("\n".join(lines) + "\n")
+    os.replace(tmp_path, file_path)
+
+
+# === Utilidades ===
+def _iso(epoch):
+    return datetime.datetime.fromtimestamp(epoch, datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _stage_order(name):
+    return STAGES.index(name) if name in STAGES else len(STAGES)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
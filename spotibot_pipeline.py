@@ -0,0 +1,214 @@
+############# EXPLICACION ##############
+# Ejecución de una sincronización completa procesando varios géneros a la vez.
+# Los géneros son independientes salvo por el registro global de canciones, que vive en el
+# TrackStore compartido: cada género "reserva" (claim) las canciones antes de añadirlas, así que
+# dos géneros nunca añaden la misma canción aunque se procesen en paralelo.
+# Una ejecución se puede cancelar (p. ej. desde el bot de Telegram): los géneros que aún no han empezado se
+# saltan y los que están en marcha se detienen antes de reservar y añadir canciones.
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from spotibot_dedup import BACKFILL_LIMIT, RecordingIndex, track_key
+from spotibot_fetch import PlaylistFetcher, fetch_changed_playlists
+from spotibot_filters import classify_tracks
+from spotibot_metrics import REPORT_FILE, RunMetrics, write_prometheus, write_report
+from spotibot_rotation import RotationPolicy
+from spotibot_state import CoverStore, PlaylistIndex, SnapshotStore, TargetCache, cutoff_timestamp
+from spotibot_store import GLOBAL_SCOPE, TrackStore, genre_scope, playlist_scope
+from spotibot_writer import PlaylistWriter
+
+GENRE_WORKERS = 3  # Géneros procesados a la vez (SPOTIBOT_GENRE_WORKERS en config.txt)
+
+
+class SyncCancelled(Exception):
+    """La ejecución se canceló antes de terminar este género."""
+
+
+# === Estado compartido de una ejecución ===
+class SyncContext:
+    """Cliente, cachés e historial que comparten todos los géneros durante una ejecución."""
+
+    def __init__(self, sp, user_id, config, dias, metrics=None, index=None, covers=None, cancel=None):
+        self.sp = sp
+        self.user_id = user_id
+        self.config = config
+        self.dias = dias
+        self.metrics = metrics if metrics is not None else RunMetrics()
+        if self.metrics.scheduler is None and hasattr(sp, "scheduler"):
+            self.metrics.track_api(sp.scheduler)
+        self.cutoff = cutoff_timestamp(dias)
+        self.cancel = cancel if cancel is not None else threading.Event()
+        self.fetcher = PlaylistFetcher.from_config(sp, config)
+        self.snapshots = SnapshotStore()
+        self.snapshot_ids = {}
+        # (género, playlist_id) cuyas canciones no se pudieron añadir: el modo servicio las reintenta antes
+        self.failed = set()
+        # Historial de canciones ya procesadas (se importan los .txt antiguos la primera vez)
+        self.store = TrackStore()
+        self.store.import_text_files()
+        self.recordings = RecordingIndex(self.store)
+        # El modo servicio pasa su índice y caché de portadas para reutilizarlos entre ciclos
+        self.index = index if index is not None else PlaylistIndex(ttl=int(config.get("SPOTIBOT_INDEX_TTL", 3600)))
+        self.covers = covers if covers is not None else CoverStore()
+        self.targets = TargetCache()
+        self.rotation = RotationPolicy.from_config(config)
+        self.writer = PlaylistWriter(sp, self.store, on_added=self.targets.record_added,
+                                     on_removed=self.targets.record_removed,
+                                     members=lambda playlist_id: self.target_members(playlist_id)[0])
+
+    def start(self):
+        """Reanuda las altas pendientes y completa parte de las claves de grabación del historial."""
+        self.writer.resume()
+        self.recordings.backfill(self.sp, int(self.config.get("SPOTIBOT_ISRC_BACKFILL", BACKFILL_LIMIT)))
+
+    def fetch_sources(self, genre, playlists):
+        """Descarga a la vez las playlists de origen de un género (omitiendo las que no han cambiado)."""
+        with self.metrics.stage("fetch") as stage:
+            tracks_by_playlist, snapshot_ids = fetch_changed_playlists(
+                self.fetcher, genre, [playlist['id'] for playlist in playlists], self.snapshots, self.cutoff)
+            stage.items = sum(len(tracks) for tracks in tracks_by_playlist.values())
+        self.snapshot_ids.update(snapshot_ids)
+        self.check_cancelled()  # Última parada antes de reservar canciones y escribir en las playlists
+        return tracks_by_playlist
+
+    def select_new_tracks(self, genre, sources, target_ids=frozenset(), target_keys=frozenset()):
+        """Elige las canciones nuevas del género y las reserva: la misma regla para ejecutar, planificar y aplicar.
+
+        'sources' es [(playlist_id, [TrackItem])]. Se descartan las antiguas, las del historial del género (y el
+        antiguo por playlist de origen), las de la playlist de destino, las de altas pendientes, las repetidas,
+        las de una grabación ya añadida y las que otro género ya tiene o está añadiendo.
+        Devuelve ({playlist_id: [elegidas]}, {playlist_id: [(canción, motivo)]}); las elegidas quedan reservadas
+        y hay que liberarlas con release_tracks() si no se llegan a añadir.
+        """
+        pending_ids, pending_keys = self.writer.pending_ids(), self.writer.pending_keys()
+        selected, skipped, seen = {}, {}, set()
+        for playlist_id, tracks in sources:
+            history = self.store.known_ids([genre_scope(genre), playlist_scope(playlist_id)],
+                                           [track.id for track in tracks if track.id])
+            exclusions = [("history", history), ("target", target_ids), ("pending", pending_ids)]
+            skipped[playlist_id] = []
+            candidates = classify_tracks(tracks, self.cutoff, exclusions, seen, skipped[playlist_id])
+
+            # La misma grabación con otro ID (mismo ISRC, o mismo artista y título) cuenta como repetida
+            chosen, claimed_keys = self.recordings.claim(candidates, target_keys | pending_keys)
+            chosen_ids = {track.id for track in chosen}
+            skipped[playlist_id] += [(track, "recording") for track in candidates if track.id not in chosen_ids]
+
+            # Reservar en el registro global: si otro género ya tiene la canción (o la está añadiendo), se descarta
+            claimed = self.store.claim(GLOBAL_SCOPE, list(chosen_ids))
+            skipped[playlist_id] += [(track, "global") for track in chosen if track.id not in claimed]
+            selected[playlist_id] = [track for track in chosen if track.id in claimed]
+            self.recordings.release(claimed_keys - {track_key(track) for track in selected[playlist_id]})
+        return selected, skipped
+
+    def release_tracks(self, tracks):
+        """Libera las reservas de select_new_tracks() de canciones que al final no se añadieron."""
+        self.store.release(GLOBAL_SCOPE, {track.id for track in tracks})
+        self.recordings.release({track_key(track) for track in tracks} - {None})
+
+    def target_members(self, playlist_id):
+        """IDs y claves de grabación de una playlist de destino; solo se descarga si ha cambiado por algo ajeno a SpotiBOT."""
+        with self.metrics.stage("fetch") as stage:
+            snapshot_id = self.fetcher.fetch_snapshot_ids([playlist_id])[playlist_id]
+            cached = self.targets.members(playlist_id, snapshot_id)
+            if cached is not None:
+                return cached
+            tracks = self.fetcher.fetch_playlist(playlist_id)
+            stage.items = len(tracks)
+            rows = [(track.id, track_key(track), track.added_at) for track in tracks if track.id]
+            if playlist_id not in self.fetcher.errors:
+                self.targets.replace(playlist_id, snapshot_id, rows)
+            return {row[0] for row in rows}, {row[1] for row in rows if row[1]}
+
+    def expired_tracks(self, genre, playlist_id):
+        """Modo 'window': canciones de la playlist de destino que ya han salido de la ventana.
+
+        Solo las que SpotiBOT añadió al género (están en su historial); las que puso el usuario no se tocan.
+        """
+        cutoff = self.rotation.expiry_cutoff()
+        if cutoff is None:
+            return []
+        expired = self.targets.expired(playlist_id, cutoff)
+        added = self.store.known_ids([genre_scope(genre)], expired)
+        return [track_id for track_id in expired if track_id in added]
+
+    def expire_target(self, genre, playlist_id):
+        """Modo 'window': quita de la playlist de destino las canciones que ya han salido de la ventana."""
+        expired = self.expired_tracks(genre, playlist_id)
+        if expired:
+            with self.metrics.stage("rotate") as stage:
+                stage.items = self.writer.remove_tracks(playlist_id, expired)
+            print(f"Quitadas {len(expired)} canciones añadidas hace más de {self.rotation.days} días.")
+        return len(expired)
+
+    def check_cancelled(self):
+        """Lanza SyncCancelled si se ha pedido cancelar la ejecución."""
+        if self.cancel.is_set():
+            raise SyncCancelled("sincronización cancelada")
+
+    def mark_processed(self, genre, playlist_id):
+        """Da por procesada para el género la versión actual de una playlist de origen si se descargó sin errores."""
+        if playlist_id not in self.fetcher.errors:
+            self.snapshots.record(genre, playlist_id, self.snapshot_ids.get(playlist_id), self.cutoff)
+
+    def close(self):
+        # Primero el historial y después los snapshots, para no dar por procesado nada sin registrar
+        with self.metrics.stage("persist"):
+            self.writer.finish()
+            self.store.close()
+            self.writer.forget_completed()
+            self.snapshots.save()
+            self.targets.save()
+
+    def write_report(self):
+        """Guarda el informe de la ejecución en data/last_run.json (y en SPOTIBOT_METRICS_FILE si está configurado)."""
+        self.metrics.finished = time.time()
+        failed = [genre for genre, entry in self.metrics.genres.items() if "error" in entry]
+        status = ("cancelled" if self.cancel.is_set() else "error" if failed
+                  else "partial" if self.fetcher.errors else "ok")
+        report = self.metrics.report(status=status, days=self.dias, fetch_errors=sorted(self.fetcher.errors))
+        try:
+            write_report(report, self.config.get("SPOTIBOT_REPORT_FILE", REPORT_FILE))
+            if self.config.get("SPOTIBOT_METRICS_FILE"):
+                write_prometheus(report, self.config["SPOTIBOT_METRICS_FILE"])
+        except OSError as e:
+            print(f"No se pudo guardar el informe de la ejecución: {e}")
+        return report
+
+
+# === Procesado de los géneros en paralelo ===
+def run_genres(ctx, playlists_by_genre, process_genre, max_workers=GENRE_WORKERS, on_done=None):
+    """Ejecuta process_genre(ctx, genre, playlists) para varios géneros a la vez.
+
+    Devuelve {género: resultado} en el orden de playlists.txt; si un género falla su resultado es la excepción.
+    on_done(genre, resultado) se llama según va terminando cada uno.
+    """
+    results = {}
+    with ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="spotibot-genre") as executor:
+        futures = {executor.submit(_run_genre, ctx, genre, playlists, process_genre): genre
+                   for genre, playlists in playlists_by_genre.items()}
+        for future in as_completed(futures):
+            genre = futures[future]
+            try:
+                results[genre] = future.result()
+            except SyncCancelled as e:
+                results[genre] = e
+            except Exception as e:
+                print(f"Error al procesar el género {genre}: {e}")
+                results[genre] = e
+            if on_done:
+                on_done(genre, results[genre])
+    return {genre: results[genre] for genre in playlists_by_genre}
+
+
+def _run_genre(ctx, genre, playlists, process_genre):
+    start = time.perf_counter()
+    try:
+        ctx.check_cancelled()
+        result = process_genre(ctx, genre, playlists)
+    except Exception as e:
+        ctx.metrics.record_genre(genre, time.perf_counter() - start, e)
+        raise
+    ctx.metrics.record_genre(genre, time.perf_counter() - start, result)
+    return result
@@ -0,0 +1,96 @@
+############# EXPLICACION ##############
+# Planificación en seco (python spotibot_core.py --dias 7 --plan data/plan.json) y aplicación de un plan
+# guardado (python spotibot_core.py --apply data/plan.json).
+# El plan se calcula con las mismas descargas, cachés y filtros que una ejecución normal, pero sin tocar
+# las playlists ni el historial. Recoge, por género: la playlist de destino, las canciones a añadir (y a
+# quitar en la rotación 'window'), por qué se descartó cada una de las demás y una estimación de las
+# escrituras necesarias. Al aplicarlo solo se hacen las escrituras por bloques; antes se vuelve a comprobar
+# el historial local por si otra ejecución añadió alguna de esas canciones entretanto.
+import datetime
+import math
+import os
+
+from spotibot_dedup import track_key
+from spotibot_fetch import TrackItem
+from spotibot_state import DATA_DIR, JsonState
+from spotibot_writer import MAX_ITEMS_PER_REQUEST
+
+PLAN_FILE = os.path.join(DATA_DIR, "plan.json")
+PLAN_VERSION = 2  # 2: cada canción guarda su ISRC y su fecha de adición
+# Motivos por los que una canción de las playlists de origen no se añade (ver SyncContext.select_new_tracks)
+REASONS = {
+    "no_id": "sin ID (canción local o no disponible)",
+    "invalid_date": "sin fecha de adición válida",
+    "old": "añadida a la playlist de origen antes del rango de días",
+    "history": "ya añadida antes a este género",
+    "target": "ya está en la playlist de destino",
+    "pending": "en un alta pendiente de una ejecución anterior",
+    "repeat": "repetida entre las playlists de origen del género",
+    "recording": "misma grabación (ISRC o artista y título) ya añadida o elegida",
+    "global": "ya añadida a otro género o elegida por otro género en este plan",
+}
+# Motivos que se cuentan pero no se listan canción a canción (suelen ser la mayoría)
+UNLISTED_REASONS = {"no_id", "invalid_date", "old"}
+
+
+# === Canciones del plan ===
+def plan_track(track, source_id, reason=None):
+    entry = {"id": track.id, "uri": track.uri, "key": track_key(track), "name": track.name, "artist": track.artist,
+             "isrc": track.isrc, "added_at": track.added_at, "source": source_id}
+    if reason:
+        entry["reason"] = reason
+    return entry
+
+
+def plan_track_item(entry):
+    """TrackItem de una canción del plan, para volver a pasarla por SyncContext.select_new_tracks al aplicarlo."""
+    return TrackItem(entry["id"], entry["uri"], entry["added_at"], entry["name"], entry["isrc"], entry["artist"])
+
+
+# === Estimación de escrituras ===
+def estimate_writes(entry):
+    """Llamadas de escritura que hará la aplicación del plan de un género."""
+    calls = {
+        "user_playlist_create": 0 if entry["playlist_id"] else 1,
+        "playlist_change_details": 0 if entry["playlist_id"] else 1,
+        "playlist_remove_all_occurrences_of_items": math.ceil(len(entry["remove"]) / MAX_ITEMS_PER_REQUEST),
+        "playlist_add_items": math.ceil(len(entry["add"]) / MAX_ITEMS_PER_REQUEST),
+        "playlist_upload_cover_image": 0 if entry["cover_current"] else 1,
+    }
+    return {endpoint: count for endpoint, count in calls.items() if count}
+
+
+def summarize(plan):
+    """Totales del plan: canciones a añadir y quitar, descartes por motivo y escrituras estimadas."""
+    totals = {"add": 0, "remove": 0, "skipped": {}, "writes": {}}
+    for entry in plan["genres"].values():
+        totals["add"] += len(entry["add"])
+        totals["remove"] += len(entry["remove"])
+        for reason, count in entry["skipped"].items():
+            totals["skipped"][reason] = totals["skipped"].get(reason, 0) + count
+        for endpoint, count in entry["estimated_writes"].items():
+            totals["writes"][endpoint] = totals["writes"].get(endpoint, 0) + count
+    totals["estimated_calls"] = sum(totals["writes"].values())
+    return totals
+
+
+# === Ficheros de plan ===
+def new_plan(user_id, dias, cutoff):
+    created_at = datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+    return {"version": PLAN_VERSION, "created_at": created_at, "user_id": user_id, "days": dias, "cutoff": cutoff,
+            "reasons": REASONS, "genres": {}}
+
+
+def save_plan(plan, file_path=PLAN_FILE):
+    state = JsonState(file_path)
+    state.data = plan
+    state.save()
+
+
+def load_plan(file_path=PLAN_FILE):
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(f"El plan '{file_path}' no existe.")
+    plan = JsonState(file_path).data
+    if plan.get("version") != PLAN_VERSION or "genres" not in plan:
+        raise ValueError(f"'{file_path}' no es un plan válido de SpotiBOT.")
+    return plan
@@ -0,0 +1,84 @@
+############# EXPLICACION ##############
+# Rotación de las playlists de destino para que no crezcan sin límite: Spotify va lenta a partir de
+# ~10.000 canciones y cada ejecución comprueba su contenido. Se elige con SPOTIBOT_ROTATION en config.txt:
+#   - year (por defecto): una playlist por año, "TECHNO 2025", como hasta ahora
+#   - month: una por mes, "TECHNO 2025-03"
+#   - week: una por semana ISO, "TECHNO 2025-W11"
+#   - size: como year, pero al llegar a SPOTIBOT_ROTATION_SIZE canciones se abre "TECHNO 2025 #2", "#3"...
+#   - window: una sola playlist "TECHNO · SpotiBOT" de la que se quitan las canciones que SpotiBOT añadió hace
+#     más de SPOTIBOT_ROTATION_DAYS días (el sufijo evita confundirla con una playlist "TECHNO" del usuario)
+# Las playlists nuevas se crean con el mismo nombre base, descripción e imagen que las anuales.
+import datetime
+import os
+
+from spotibot_state import DATA_DIR, JsonState, cutoff_timestamp
+
+ROTATION = "year"  # Modo por defecto (SPOTIBOT_ROTATION)
+MODES = ("year", "month", "week", "size", "window")
+MAX_PLAYLIST_SIZE = 10000  # Canciones por playlist en el modo 'size' (SPOTIBOT_ROTATION_SIZE)
+WINDOW_DAYS = 90  # Días que se conserva cada canción en el modo 'window' (SPOTIBOT_ROTATION_DAYS)
+WINDOW_SUFFIX = "· SpotiBOT"  # Sufijo del nombre en el modo 'window', que no lleva periodo
+
+
+# === Parte actual de cada género (modo 'size') ===
+class RotationState(JsonState):
+    """{género: {"period": "2025", "part": 2}}: la numeración vuelve a 1 al cambiar de periodo."""
+
+    def __init__(self, file_path=os.path.join(DATA_DIR, "rotation.json")):
+        super().__init__(file_path)
+
+
+# === Política de rotación ===
+class RotationPolicy:
+    """Decide el nombre de la playlist de destino de cada género y cuándo hay que rotarla."""
+
+    def __init__(self, mode=ROTATION, size=MAX_PLAYLIST_SIZE, days=WINDOW_DAYS, state=None):
+        if mode not in MODES:
+            raise ValueError(f"Rotación no válida: '{mode}' (opciones: {', '.join(MODES)})")
+        self.mode = mode
+        self.size = size
+        self.days = days
+        self.state = state if state is not None else (RotationState() if mode == "size" else None)
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(config.get("SPOTIBOT_ROTATION", ROTATION).strip().lower(),
+                   int(config.get("SPOTIBOT_ROTATION_SIZE", MAX_PLAYLIST_SIZE)),
+                   int(config.get("SPOTIBOT_ROTATION_DAYS", WINDOW_DAYS)))
+
+    def period(self, today=None):
+        """Parte del nombre que cambia con el tiempo ('2025', '2025-03', '2025-W11'); None en el modo 'window'."""
+        today = today or datetime.date.today()
+        if self.mode == "month":
+            return f"{today.year}-{today.month:02d}"
+        if self.mode == "week":
+            year, week, _ = today.isocalendar()
+            return f"{year}-W{week:02d}"
+        if self.mode == "window":
+            return None
+        return str(today.year)
+
+    def part(self, genre):
+        if self.state is None:
+            return 1
+        entry = self.state.data.get(genre)
+        return entry["part"] if entry and entry["period"] == self.period() else 1
+
+    def playlist_name(self, base_name, genre, part=None):
+        period = self.period()
+        name = f"{base_name} {period or WINDOW_SUFFIX}"
+        part = part or self.part(genre)
+        return f"{name} #{part}" if part > 1 else name
+
+    def is_full(self, count):
+        return self.mode == "size" and count >= self.size
+
+    def advance(self, genre):
+        """Pasa el género a la siguiente parte (modo 'size')."""
+        with self.state.lock:
+            self.state.data[genre] = {"period": self.period(), "part": self.part(genre) + 1}
+            self.state.save()
+
+    def expiry_cutoff(self):
+        """Fecha antes de la cual se quitan canciones (modo 'window'); None si no se quita nada."""
+        return cutoff_timestamp(self.days) if self.mode == "window" else None
@@ -0,0 +1,179 @@
+############# EXPLICACION ##############
+# Planificador central de peticiones a la API de Spotify.
+# Todas las llamadas sp.* pasan por aquí: se limita el ritmo con un token bucket, se respeta la
+# cabecera Retry-After de los 429, se reintentan los errores 5xx/de red con espera exponencial
+# aleatoria y se cuentan las llamadas por endpoint.
+import functools
+import random
+import threading
+import time
+
+# === Valores por defecto (se pueden cambiar en config.txt) ===
+RATE_LIMIT = 10  # Peticiones por segundo hacia api.spotify.com
+MAX_RETRIES = 5
+BASE_DELAY = 1.0  # Segundos de la primera espera
+MAX_DELAY = 60.0
+API_HOST = "api.spotify.com"
+
+# Escrituras que no se repiten ante un 5xx o un corte de red: podrían haberse aplicado ya
+# (un 429 sí se reintenta siempre, porque Spotify no llegó a procesar la petición)
+NON_IDEMPOTENT = {"playlist_add_items", "user_playlist_create"}
+
+
+# === Errores de la API ===
+@functools.lru_cache(maxsize=None)
+def api_errors():
+    """Errores que pueden quedar tras agotar los reintentos: (SpotifyException, errores de red...).
+
+    spotipy y requests tardan en importarse, así que no se cargan hasta que hacen falta: en un
+    'except api_errors()' solo se evalúa cuando ya ha saltado una excepción.
+    """
+    import requests
+    from spotipy.exceptions import SpotifyException
+    return SpotifyException, requests.exceptions.ConnectionError, requests.exceptions.Timeout
+
+
+# === Limitador de peticiones por host (token bucket) ===
+class RateLimiter:
+    """Reparte un presupuesto de peticiones por segundo entre todos los hilos."""
+
+    def __init__(self, rate=RATE_LIMIT, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst if burst is not None else max(1, rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def pause(self, seconds):
+        """Detiene a todos los hilos (p. ej. tras un 429) durante 'seconds'."""
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.tokens = 0
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    wait = self.paused_until - now
+                elif self.rate <= 0:
+                    return
+                else:
+                    self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                    self.updated = now
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+# === Planificador ===
+class RequestScheduler:
+    """Ejecuta llamadas a la API con límite de ritmo, reintentos y contadores."""
+
+    def __init__(self, rate=RATE_LIMIT, max_retries=MAX_RETRIES, base_delay=BASE_DELAY, max_delay=MAX_DELAY):
+        self.limiters = {API_HOST: RateLimiter(rate)}
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.lock = threading.Lock()
+        self.counters = {"calls": {}, "retries": 0, "throttled": 0, "server_errors": 0, "failures": 0, "wait_seconds": 0.0}
+        self.http_cache = None  # ResponseCache del cliente, para sumar sus contadores a los del planificador
+
+    @classmethod
+    def from_config(cls, config):
+        """Crea el planificador con SPOTIBOT_RATE_LIMIT y SPOTIBOT_MAX_RETRIES de config.txt (opcionales)."""
+        return cls(
+            rate=float(config.get("SPOTIBOT_RATE_LIMIT", RATE_LIMIT)),
+            max_retries=int(config.get("SPOTIBOT_MAX_RETRIES", MAX_RETRIES)),
+        )
+
+    def _count(self, key, amount=1):
+        with self.lock:
+            self.counters[key] += amount
+
+    def _backoff(self, attempt):
+        delay = min(self.max_delay, self.base_delay * (2 ** attempt))
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def call(self, endpoint, fn, *args, **kwargs):
+        limiter = self.limiters[API_HOST]
+        for attempt in range(self.max_retries + 1):
+            limiter.acquire()
+            with self.lock:
+                self.counters["calls"][endpoint] = self.counters["calls"].get(endpoint, 0) + 1
+            try:
+                return fn(*args, **kwargs)
+            except api_errors() as e:
+                if not isinstance(e, api_errors()[0]):  # Corte de red o timeout
+                    if endpoint in NON_IDEMPOTENT:
+                        raise
+                    self._count("server_errors")
+                    delay = self._backoff(attempt)
+                elif e.http_status == 429:
+                    self._count("throttled")
+                    delay = _retry_after(e)
+                    delay = self._backoff(attempt) if delay is None else delay
+                    limiter.pause(delay)  # Todos los hilos esperan, no solo este
+                elif e.http_status is not None and e.http_status >= 500 and endpoint not in NON_IDEMPOTENT:
+                    self._count("server_errors")
+                    delay = self._backoff(attempt)
+                else:
+                    raise
+                error = e
+            if attempt == self.max_retries:
+                self._count("failures")
+                raise error
+            self._count("retries")
+            self._count("wait_seconds", delay)
+            print(f"Reintentando {endpoint} en {delay:.1f}s ({attempt + 1}/{self.max_retries}): {error}")
+            time.sleep(delay)
+
+    def stats(self):
+        with self.lock:
+            stats = {**self.counters, "calls": dict(self.counters["calls"])}
+        if self.http_cache is not None:
+            stats.update(self.http_cache.stats())
+        return stats
+
+    def summary(self):
+        stats = self.stats()
+        total = sum(stats["calls"].values())
+        summary = (f"{total} llamadas a la API, {stats['retries']} reintentos, "
+                   f"{stats['throttled']} respuestas 429, {stats['failures']} fallos definitivos.")
+        if "cache_hits" in stats:
+            summary += (f" Caché HTTP: {stats['cache_hits']} respuestas sin cambios "
+                        f"({stats['cache_bytes_saved'] / 1024:.0f} KB sin descargar).")
+        return summary
+
+
+# === Cliente de Spotify con todas las llamadas planificadas ===
+class ScheduledSpotify:
+    """Envuelve un spotipy.Spotify para que cada método público pase por el planificador."""
+
+    def __init__(self, sp, scheduler=None):
+        object.__setattr__(self, "sp", sp)
+        object.__setattr__(self, "scheduler", scheduler or RequestScheduler())
+
+    def __getattr__(self, name):
+        attr = getattr(self.sp, name)
+        if name.startswith("_") or not callable(attr):
+            return attr
+
+        def scheduled(*args, **kwargs):
+            return self.scheduler.call(name, attr, *args, **kwargs)
+        return scheduled
+
+    def __setattr__(self, name, value):
+        setattr(self.sp, name, value)
+
+
+# === Utilidades ===
+def _retry_after(error):
+    headers = getattr(error, "headers", None) or {}
+    try:
+        return float(headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
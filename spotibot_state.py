@@ -0,0 +1,227 @@
+############# EXPLICACION ##############
+# Ficheros de estado que SpotiBOT guarda entre ejecuciones (carpeta data/).
+# Cada almacén es un JSON pequeño que se escribe de forma atómica para no corromperlo si se corta la ejecución.
+import base64
+import datetime
+import hashlib
+import json
+import os
+import threading
+import time
+
+DATA_DIR = "data"
+
+
+# === Almacén JSON genérico ===
+class JsonState:
+    """Diccionario persistido en un fichero JSON."""
+
+    def __init__(self, file_path, durable=False):
+        self.file_path = file_path
+        self.durable = durable  # fsync en cada guardado (diarios que deben sobrevivir a un corte de luz)
+        self.lock = threading.RLock()  # Varios géneros pueden usar el mismo almacén a la vez
+        self.data = {}
+        if os.path.exists(file_path):
+            try:
+                with open(file_path, "r") as f:
+                    self.data = json.load(f)
+            except (ValueError, OSError) as e:
+                print(f"No se pudo leer '{file_path}', se empieza de cero: {e}")
+                self.data = {}
+
+    def save(self):
+        dir_path = os.path.dirname(self.file_path)
+        if dir_path:
+            os.makedirs(dir_path, exist_ok=True)
+        tmp_path = f"{self.file_path}.tmp"
+        with self.lock:
+            with open(tmp_path, "w") as f:
+                json.dump(self.data, f, indent=1, sort_keys=True)
+                if self.durable:
+                    f.flush()
+                    os.fsync(f.fileno())
+            os.replace(tmp_path, self.file_path)
+            if self.durable:
+                _fsync_dir(dir_path or ".")
+
+
+# === snapshot_id de las playlists de origen ===
+class SnapshotStore(JsonState):
+    """Recuerda el snapshot_id de cada playlist de origen y el corte de fecha con el que se procesó.
+
+    {género: {playlist_id: {"snapshot_id", "cutoff"}}}: una misma playlist puede estar en varios géneros
+    y cada uno tiene su propio historial, así que cada género la da por procesada por separado.
+    """
+
+    def __init__(self, file_path=os.path.join(DATA_DIR, "snapshots.json")):
+        super().__init__(file_path)
+        # Las versiones anteriores guardaban {playlist_id: entrada} sin género: se descartan (solo cuesta una descarga)
+        self.data = {key: value for key, value in self.data.items() if "snapshot_id" not in value}
+
+    def is_unchanged(self, genre, playlist_id, snapshot_id, cutoff):
+        """True si la playlist no ha cambiado y la ventana pedida ya quedó cubierta para el género."""
+        entry = self.data.get(genre, {}).get(playlist_id)
+        if not entry or not snapshot_id:
+            return False
+        return entry["snapshot_id"] == snapshot_id and entry["cutoff"] <= cutoff
+
+    def record(self, genre, playlist_id, snapshot_id, cutoff):
+        if snapshot_id:
+            with self.lock:
+                self.data.setdefault(genre, {})[playlist_id] = {"snapshot_id": snapshot_id, "cutoff": cutoff}
+
+
+# === Índice de playlists del usuario ===
+class PlaylistIndex(JsonState):
+    """Índice nombre -> ID de las playlists del usuario, cacheado en disco durante 'ttl' segundos.
+
+    Se descarta al cambiar de año (los nombres llevan el año) o de usuario, y si un nombre no aparece
+    se vuelve a listar la biblioteca una vez antes de darlo por inexistente.
+    """
+
+    def __init__(self, file_path=os.path.join(DATA_DIR, "playlist_index.json"), ttl=3600):
+        super().__init__(file_path)
+        self.ttl = ttl
+        self.refreshed = False  # Si ya se listó la biblioteca en esta ejecución
+
+    def _is_stale(self, user_id):
+        return (
+            self.data.get("user_id") != user_id
+            or self.data.get("year") != datetime.date.today().year
+            or time.time() - self.data.get("updated", 0) > self.ttl
+        )
+
+    def refresh(self, sp, user_id):
+        """Lista la biblioteca completa del usuario una sola vez y guarda el índice."""
+        playlists = {}
+        results = sp.current_user_playlists(limit=50)
+        while results:
+            for playlist in results['items']:
+                if playlist and 'name' in playlist:
+                    playlists.setdefault(playlist['name'], playlist['id'])  # Gana la primera, como antes
+            results = sp.next(results) if results['next'] else None
+        self.data = {"user_id": user_id, "year": datetime.date.today().year, "updated": time.time(), "playlists": playlists}
+        self.refreshed = True
+        self.save()
+
+    def lookup(self, sp, user_id, name):
+        with self.lock:  # Si varios géneros preguntan a la vez, la biblioteca se lista una sola vez
+            if self._is_stale(user_id):
+                self.refresh(sp, user_id)
+            playlist_id = self.data["playlists"].get(name)
+            if playlist_id is None and not self.refreshed:
+                # Puede que se haya creado desde otro proceso (cron o bot) después de cachear el índice
+                self.refresh(sp, user_id)
+                playlist_id = self.data["playlists"].get(name)
+            return playlist_id
+
+    def add(self, name, playlist_id):
+        with self.lock:
+            self.data.setdefault("playlists", {})[name] = playlist_id
+            self.save()
+
+
+# === Contenido de las playlists de destino ===
+class TargetCache(JsonState):
+    """Canciones [id, clave, added_at] de cada playlist de destino, válidas mientras su snapshot_id no cambie.
+
+    Las altas de SpotiBOT se aplican aquí directamente junto con el snapshot_id que devuelve Spotify,
+    así que solo hay que volver a descargar la playlist si alguien la ha modificado por otro lado.
+    """
+
+    def __init__(self, file_path=os.path.join(DATA_DIR, "targets.json")):
+        super().__init__(file_path)
+
+    def members(self, playlist_id, snapshot_id):
+        """Devuelve (ids, claves) si la caché corresponde a 'snapshot_id'; None si hay que descargarla."""
+        with self.lock:
+            entry = self.data.get(playlist_id)
+            if not entry or not snapshot_id or entry["snapshot_id"] != snapshot_id:
+                return None
+            return {row[0] for row in entry["tracks"]}, {row[1] for row in entry["tracks"] if row[1]}
+
+    def replace(self, playlist_id, snapshot_id, rows):
+        """Guarda el contenido completo [(id, clave, added_at)] de una playlist recién descargada."""
+        if snapshot_id:
+            with self.lock:
+                self.data[playlist_id] = {"snapshot_id": snapshot_id, "tracks": [list(row) for row in rows]}
+
+    def record_added(self, playlist_id, rows, snapshot_id):
+        """Aplica un bloque añadido por SpotiBOT (filas del diario: [id, uri, clave])."""
+        with self.lock:
+            entry = self.data.get(playlist_id)
+            if not entry:
+                return
+            if not snapshot_id:  # Sin snapshot nuevo no se puede seguir confiando en la caché
+                del self.data[playlist_id]
+                return
+            added_at = cutoff_timestamp(0)  # Ahora, en el formato de 'added_at'
+            entry["tracks"].extend([row[0], row[2] if len(row) > 2 else None, added_at] for row in rows)
+            entry["snapshot_id"] = snapshot_id
+
+    def record_removed(self, playlist_id, track_ids, snapshot_id):
+        """Aplica un bloque de canciones quitadas por SpotiBOT."""
+        with self.lock:
+            entry = self.data.get(playlist_id)
+            if not entry:
+                return
+            if not snapshot_id:
+                del self.data[playlist_id]
+                return
+            removed = set(track_ids)
+            entry["tracks"] = [row for row in entry["tracks"] if row[0] not in removed]
+            entry["snapshot_id"] = snapshot_id
+
+    def expired(self, playlist_id, cutoff):
+        """IDs añadidos antes de 'cutoff' (llamar después de members() para trabajar sobre el contenido actual)."""
+        with self.lock:
+            entry = self.data.get(playlist_id) or {"tracks": []}
+            return list(dict.fromkeys(row[0] for row in entry["tracks"] if len(row) > 2 and row[2] and row[2] < cutoff))
+
+
+# === Portadas subidas a cada playlist ===
+class CoverStore(JsonState):
+    """Guarda el hash de la última imagen subida a cada playlist y cachea las imágenes ya codificadas."""
+
+    def __init__(self, file_path=os.path.join(DATA_DIR, "covers.json")):
+        super().__init__(file_path)
+        self.encoded = {}  # ruta -> (mtime, hash, imagen en base64) durante esta ejecución
+
+    def load_image(self, image_path):
+        """Devuelve (hash, imagen en base64) leyendo el fichero solo si ha cambiado."""
+        mtime = os.path.getmtime(image_path)
+        cached = self.encoded.get(image_path)
+        if cached and cached[0] == mtime:
+            return cached[1], cached[2]
+        with open(image_path, "rb") as image_file:
+            raw = image_file.read()
+        image_hash = hashlib.sha256(raw).hexdigest()
+        self.encoded[image_path] = (mtime, image_hash, base64.b64encode(raw))
+        return image_hash, self.encoded[image_path][2]
+
+    def is_current(self, playlist_id, image_hash):
+        return self.data.get(playlist_id) == image_hash
+
+    def record(self, playlist_id, image_hash):
+        with self.lock:
+            self.data[playlist_id] = image_hash
+            self.save()
+
+
+# === Utilidades ===
+def _fsync_dir(dir_path):
+    """Asegura en disco el renombrado de un fichero (en Windows no se puede abrir un directorio)."""
+    try:
+        fd = os.open(dir_path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def cutoff_timestamp(days):
+    """Fecha de corte (UTC, mismo formato que 'added_at') para quedarse con los últimos 'days' días."""
+    cutoff = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=days)
+    return cutoff.strftime('%Y-%m-%dT%H:%M:%SZ')
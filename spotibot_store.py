@@ -0,0 +1,162 @@
+############# EXPLICACION ##############
+# Historial de canciones ya procesadas en una base de datos SQLite (data/spotibot.db).
+# Sustituye a global_tracks.txt y data/*_tracks.txt: cada canción se guarda una vez por "ámbito"
+# (global, género o playlist de origen) con la fecha en que se registró.
+import datetime
+import glob
+import os
+import sqlite3
+import threading
+
+DB_FILE = os.path.join("data", "spotibot.db")
+GLOBAL_SCOPE = "global"
+RECORDING_SCOPE = "recording"  # Claves de grabación (ISRC o artista + título) de las canciones añadidas
+RECORDED_IDS_SCOPE = "recording-ids"  # IDs cuya clave de grabación ya está registrada
+SQL_BATCH = 500  # Parámetros por consulta (SQLite admite 999 en versiones antiguas)
+
+
+# === Ámbitos del historial ===
+def genre_scope(genre):
+    return f"genre:{genre}"
+
+
+def playlist_scope(playlist_id):
+    return f"playlist:{playlist_id}"
+
+
+# === Almacén de canciones ===
+class TrackStore:
+    """Historial indexado por (ámbito, track_id). Las altas se acumulan y se guardan en una sola transacción."""
+
+    def __init__(self, db_path=DB_FILE):
+        dir_path = os.path.dirname(db_path)
+        if dir_path:
+            os.makedirs(dir_path, exist_ok=True)
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=FULL")  # Una sola transacción por ejecución: que llegue al disco
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS tracks ("
+            " scope TEXT NOT NULL, track_id TEXT NOT NULL, seen_at TEXT NOT NULL,"
+            " PRIMARY KEY (scope, track_id)) WITHOUT ROWID"
+        )
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self.conn.commit()
+        self.pending = {}  # scope -> {track_id: seen_at} pendientes de guardar
+        self.claims = {}  # scope -> {track_id} reservadas por un género durante esta ejecución
+        self.lock = threading.RLock()
+
+    def known_ids(self, scopes, track_ids):
+        """Devuelve el subconjunto de track_ids que ya está registrado en alguno de los ámbitos."""
+        track_ids = list(dict.fromkeys(tid for tid in track_ids if tid))
+        known = set()
+        with self.lock:
+            for scope in scopes:
+                pending = self.pending.get(scope)
+                if pending:
+                    known.update(tid for tid in track_ids if tid in pending)
+            remaining = [tid for tid in track_ids if tid not in known]
+            scope_marks = ",".join("?" * len(scopes))
+            for i in range(0, len(remaining), SQL_BATCH):
+                batch = remaining[i:i + SQL_BATCH]
+                rows = self.conn.execute(
+                    f"SELECT DISTINCT track_id FROM tracks WHERE scope IN ({scope_marks})"
+                    f" AND track_id IN ({','.join('?' * len(batch))})",
+                    [*scopes, *batch],
+                )
+                known.update(row[0] for row in rows)
+        return known
+
+    def claim(self, scope, track_ids):
+        """Reserva de forma atómica las canciones que aún no están en el ámbito ni reservadas por otro.
+
+        Devuelve el conjunto reservado; si luego no se llegan a añadir hay que liberarlas con release().
+        """
+        with self.lock:
+            known = self.known_ids([scope], track_ids)
+            claims = self.claims.setdefault(scope, set())
+            claimed = {tid for tid in track_ids if tid and tid not in known and tid not in claims}
+            claims.update(claimed)
+            return claimed
+
+    def release(self, scope, track_ids):
+        with self.lock:
+            self.claims.get(scope, set()).difference_update(track_ids)
+
+    def add(self, scope, track_ids):
+        """Registra canciones en un ámbito (se guardan en disco al llamar a commit())."""
+        now = _now()
+        with self.lock:
+            pending = self.pending.setdefault(scope, {})
+            for track_id in track_ids:
+                if track_id:
+                    pending.setdefault(track_id, now)
+
+    def commit(self):
+        """Guarda todas las altas pendientes en una única transacción."""
+        with self.lock:
+            rows = [(scope, tid, seen_at) for scope, tracks in self.pending.items() for tid, seen_at in tracks.items()]
+            if not rows:
+                return 0
+            with self.conn:
+                self.conn.executemany("INSERT OR IGNORE INTO tracks (scope, track_id, seen_at) VALUES (?, ?, ?)", rows)
+            self.pending = {}
+            return len(rows)
+
+    def missing_ids(self, scope, done_scope, limit):
+        """IDs guardados en 'scope' que aún no están en 'done_scope' (como mucho 'limit')."""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT track_id FROM tracks WHERE scope = ? AND track_id NOT IN"
+                " (SELECT track_id FROM tracks WHERE scope = ?) LIMIT ?", (scope, done_scope, limit))
+            done = self.pending.get(done_scope, {})
+            return [row[0] for row in rows if row[0] not in done]
+
+    def count(self, scope):
+        with self.lock:
+            row = self.conn.execute("SELECT COUNT(*) FROM tracks WHERE scope = ?", (scope,)).fetchone()
+            return row[0] + len(self.pending.get(scope, {}))
+
+    def close(self):
+        self.commit()
+        self.conn.close()
+
+    # === Importación de los ficheros de texto antiguos (solo una vez) ===
+    def import_text_files(self, data_dir="data", global_file="global_tracks.txt"):
+        """Importa global_tracks.txt, data/*_old_tracks.txt y data/*_tracks.txt si no se hizo antes."""
+        with self.lock:
+            if self.conn.execute("SELECT 1 FROM meta WHERE key = 'text_files_imported'").fetchone():
+                return 0
+
+            sources = []
+            if os.path.exists(global_file):
+                sources.append((GLOBAL_SCOPE, global_file))
+            for path in sorted(glob.glob(os.path.join(data_dir, "*_tracks.txt"))):
+                name = os.path.basename(path)
+                if name.endswith("_old_tracks.txt"):  # Histórico por género de spotibot_core.py
+                    sources.append((genre_scope(name[:-len("_old_tracks.txt")]), path))
+                else:  # Histórico por playlist de TelegramSpotiBOT.py
+                    sources.append((playlist_scope(f"spotify:playlist:{name[:-len('_tracks.txt')]}"), path))
+
+            rows = []
+            for scope, path in sources:
+                seen_at = _timestamp(os.path.getmtime(path))
+                with open(path, "r") as f:
+                    rows.extend((scope, line.strip(), seen_at) for line in f if line.strip())
+
+            with self.conn:
+                self.conn.executemany("INSERT OR IGNORE INTO tracks (scope, track_id, seen_at) VALUES (?, ?, ?)", rows)
+                self.conn.execute("INSERT INTO meta (key, value) VALUES ('text_files_imported', ?)", (_now(),))
+            if rows:
+                print(f"Importadas {len(rows)} canciones del historial en texto a '{self.db_path}'.")
+            return len(rows)
+
+
+# === Utilidades ===
+def _timestamp(epoch):
+    return datetime.datetime.fromtimestamp(epoch, datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def _now():
+    return datetime.datetime.now(datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
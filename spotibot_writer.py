@@ -0,0 +1,186 @@
+############# EXPLICACION ##############
+# Escritura de canciones en las playlists de destino.
+# Divide las altas (y las bajas de la rotación) en bloques de 100 (máximo de la API) y los envía en orden;
+# cada playlist de destino tiene su propia cola, así que varias playlists se escriben en paralelo sin
+# mezclar el orden.
+# El diario data/pending_adds.json (con fsync) funciona como registro previo: cada trabajo se apunta antes de
+# enviarlo, cada bloque se marca "en curso" antes de llamar a la API y "confirmado" después. Si la ejecución
+# se corta, la siguiente retoma los bloques que faltan sin perder su historial; un bloque que quedó en curso
+# se comprueba contra el contenido de la playlist para no añadir dos veces lo que ya entró.
+# El historial se guarda al final en una única transacción (TrackStore.commit).
+import itertools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from spotibot_state import DATA_DIR, JsonState
+from spotibot_store import RECORDED_IDS_SCOPE, RECORDING_SCOPE
+
+MAX_ITEMS_PER_REQUEST = 100  # Máximo de canciones por llamada para añadir o quitar
+MAX_RESUME_ATTEMPTS = 3  # Ejecuciones seguidas que se intenta reanudar un alta antes de descartarla
+
+
+# === Diario de altas pendientes ===
+class AddJournal(JsonState):
+    """Trabajos de alta en curso: {job_id: {playlist_id, tracks: [[id, uri, clave]], scopes, committed, inflight}}."""
+
+    def __init__(self, file_path=os.path.join(DATA_DIR, "pending_adds.json")):
+        super().__init__(file_path, durable=True)
+
+
+# === Escritor de playlists ===
+class PlaylistWriter:
+    """Añade canciones por bloques en orden, registra su historial y permite reanudar trabajos fallidos."""
+
+    def __init__(self, sp, store, journal=None, on_added=None, on_removed=None, members=None):
+        self.sp = sp
+        self.store = store
+        self.journal = journal if journal is not None else AddJournal()
+        self.on_added = on_added  # on_added(playlist_id, filas, snapshot_id) tras cada bloque confirmado
+        self.on_removed = on_removed  # on_removed(playlist_id, ids, snapshot_id) tras cada bloque quitado
+        self.members = members  # members(playlist_id) -> IDs actuales, para comprobar bloques que quedaron en curso
+        self.queues = {}  # playlist_id -> ejecutor de un solo hilo (mantiene el orden por playlist)
+        self.lock = threading.Lock()
+        self.ids = itertools.count(int(max(self.journal.data, key=int, default=0)) + 1)
+
+    def _queue(self, playlist_id):
+        with self.lock:
+            if playlist_id not in self.queues:
+                self.queues[playlist_id] = ThreadPoolExecutor(max_workers=1, thread_name_prefix="spotibot-writer")
+            return self.queues[playlist_id]
+
+    def _record_history(self, job, start, end):
+        rows = job["tracks"][start:end]
+        track_ids = [row[0] for row in rows]
+        for scope in job["scopes"]:
+            self.store.add(scope, track_ids)
+        # Clave de grabación (ISRC o artista + título) para no volver a añadir la misma canción con otro ID
+        keyed = [row for row in rows if len(row) > 2 and row[2]]
+        if keyed:
+            self.store.add(RECORDING_SCOPE, [row[2] for row in keyed])
+            self.store.add(RECORDED_IDS_SCOPE, [row[0] for row in keyed])
+
+    def _recover_inflight(self, job):
+        """Un bloque quedó enviado sin confirmar: da por añadidas las canciones que ya están en la playlist."""
+        with self.lock:  # Otros hilos pueden estar guardando el diario mientras tanto
+            start, end = job["committed"], job.pop("inflight")
+            chunk = job["tracks"][start:end]
+        if self.members is None or end <= start:
+            return  # Sin forma de comprobarlo se vuelve a enviar, como antes
+        present = self.members(job["playlist_id"])
+        landed = [row for row in chunk if row[0] in present]
+        with self.lock:
+            if landed:
+                # Las que entraron pasan delante para quedar dentro de la parte confirmada
+                job["tracks"][start:end] = landed + [row for row in chunk if row[0] not in present]
+                job["committed"] = start + len(landed)
+            self.journal.save()
+        if landed:
+            print(f"{len(landed)} canciones de un alta interrumpida ya estaban en la playlist, no se vuelven a enviar.")
+            self._record_history(job, start, start + len(landed))
+
+    def _run(self, job_id):
+        with self.lock:
+            job = self.journal.data[job_id]
+        if "inflight" in job:
+            self._recover_inflight(job)
+        tracks = job["tracks"]
+        first = job["committed"]
+        for start in range(first, len(tracks), MAX_ITEMS_PER_REQUEST):
+            end = min(start + MAX_ITEMS_PER_REQUEST, len(tracks))
+            with self.lock:
+                job["inflight"] = end  # Registro previo: si no llega la confirmación, se comprobará al reanudar
+                self.journal.save()
+            result = self.sp.playlist_add_items(job["playlist_id"], [row[1] for row in tracks[start:end]])
+            with self.lock:
+                job["committed"] = end
+                del job["inflight"]
+                self.journal.save()
+            self._record_history(job, start, end)
+            if self.on_added:
+                self.on_added(job["playlist_id"], tracks[start:end], (result or {}).get("snapshot_id"))
+        return len(tracks) - first
+
+    def submit(self, playlist_id, tracks, scopes):
+        """Encola el alta de 'tracks' [(track_id, uri) o (track_id, uri, clave_de_grabación)] y devuelve un Future
+        con el número de canciones añadidas.
+
+        El historial de cada bloque se registra en 'scopes' en cuanto Spotify lo confirma.
+        """
+        with self.lock:
+            job_id = str(next(self.ids))
+            self.journal.data[job_id] = {"playlist_id": playlist_id, "tracks": [list(t) for t in tracks],
+                                         "scopes": list(scopes), "committed": 0}
+            self.journal.save()
+        return self._queue(playlist_id).submit(self._run, job_id)
+
+    def add_tracks(self, playlist_id, tracks, scopes):
+        return self.submit(playlist_id, tracks, scopes).result()
+
+    def _remove(self, playlist_id, track_ids):
+        for start in range(0, len(track_ids), MAX_ITEMS_PER_REQUEST):
+            batch = track_ids[start:start + MAX_ITEMS_PER_REQUEST]
+            result = self.sp.playlist_remove_all_occurrences_of_items(playlist_id, batch)
+            if self.on_removed:
+                self.on_removed(playlist_id, batch, (result or {}).get("snapshot_id"))
+        return len(track_ids)
+
+    def remove_tracks(self, playlist_id, track_ids):
+        """Quita todas las apariciones de 'track_ids' en bloques de 100, en la misma cola que las altas.
+
+        El historial no se toca: las canciones quitadas no se vuelven a añadir.
+        """
+        return self._queue(playlist_id).submit(self._remove, playlist_id, list(track_ids)).result()
+
+    def pending_ids(self):
+        """IDs de canciones de trabajos que aún no se han completado (no hay que volver a filtrarlas como nuevas)."""
+        with self.lock:
+            return {row[0] for job in self.journal.data.values() for row in job["tracks"][job["committed"]:]}
+
+    def pending_keys(self):
+        """Claves de grabación de los trabajos que aún no se han completado."""
+        with self.lock:
+            return {row[2] for job in self.journal.data.values() for row in job["tracks"][job["committed"]:]
+                    if len(row) > 2 and row[2]}
+
+    def resume(self):
+        """Reanuda los trabajos que quedaron a medias en una ejecución anterior."""
+        with self.lock:
+            jobs = dict(self.journal.data)
+        if not jobs:
+            return 0
+        print(f"Reanudando {len(jobs)} altas pendientes de una ejecución anterior...")
+        futures = {}
+        for job_id, job in jobs.items():
+            # Los bloques ya confirmados pudieron quedarse sin historial si la ejecución se cortó
+            self._record_history(job, 0, job["committed"])
+            with self.lock:
+                job["attempts"] = job.get("attempts", 0) + 1
+            futures[job_id] = self._queue(job["playlist_id"]).submit(self._run, job_id)
+        resumed = 0
+        for job_id, future in futures.items():
+            try:
+                resumed += future.result()
+            except Exception as e:
+                print(f"No se pudieron reanudar las altas pendientes en {jobs[job_id]['playlist_id']}: {e}")
+                if jobs[job_id]["attempts"] >= MAX_RESUME_ATTEMPTS:
+                    print("Se descartan tras varios intentos fallidos.")
+                    with self.lock:
+                        del self.journal.data[job_id]
+        with self.lock:
+            self.journal.save()
+        return resumed
+
+    def finish(self):
+        """Espera a que terminen todas las colas de escritura."""
+        with self.lock:
+            queues, self.queues = list(self.queues.values()), {}
+        for queue in queues:
+            queue.shutdown(wait=True)
+
+    def forget_completed(self):
+        """Olvida los trabajos completados (llamar después de guardar el historial con store.commit())."""
+        with self.lock:
+            self.journal.data = {job_id: job for job_id, job in self.journal.data.items()
+                                 if job["committed"] < len(job["tracks"])}
+            self.journal.save()